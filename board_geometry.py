@@ -0,0 +1,83 @@
+'''
+Vectorized geometry of the board lines.
+
+Lines are (rho, theta) pairs in the Hesse normal form returned by HoughLines,
+x * cos(theta) + y * sin(theta) = rho. Any of the shapes used around NaoVision
+is accepted: OpenCV's (N, 1, 2) arrays, lists of [[rho, theta]] and (N, 2) arrays.
+All intersections of two sets of lines are computed at once in closed form
+instead of solving one 2x2 system at a time.
+'''
+
+import numpy as np
+
+
+def as_lines(lines):
+    '''
+    Convert lines to a (N, 2) float64 array of (rho, theta)
+    '''
+    return np.asarray(lines, dtype = np.float64).reshape(-1, 2)
+
+
+def intersections(lines1, lines2):
+    '''
+    Intersections of every line of lines1 with every line of lines2 (Cramer's rule)
+    returns ... (len(lines1), len(lines2), 2) array of (x, y) points, parallel lines give inf / nan
+    '''
+    rho1, theta1 = as_lines(lines1).T[:, :, None]
+    rho2, theta2 = as_lines(lines2).T[:, None, :]
+    cos1, sin1 = np.cos(theta1), np.sin(theta1)
+    cos2, sin2 = np.cos(theta2), np.sin(theta2)
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        det = cos1 * sin2 - sin1 * cos2
+        x = (rho1 * sin2 - rho2 * sin1) / det
+        y = (cos1 * rho2 - cos2 * rho1) / det
+    return np.stack([x, y], axis = -1)
+
+
+def axis_intercepts(lines, horizontal):
+    '''
+    Position of the lines along the image axis they cross, used to order them
+    '''
+    rho, theta = as_lines(lines).T
+    return rho * np.sin(theta) if horizontal else rho * np.cos(theta)
+
+
+def order_lines(lines, horizontal):
+    '''
+    Lines ordered from the closest to the most distant from the origin
+    returns ... (N, 2) array of (rho, theta)
+    '''
+    lines = as_lines(lines)
+    return lines[np.argsort(axis_intercepts(lines, horizontal), kind = 'mergesort')]
+
+
+def grid(h_lines, v_lines):
+    '''
+    Grid of intersections of the ordered horizontal and vertical lines
+    returns ... (len(h_lines), len(v_lines), 2) array, point [r][c] lies on h_lines[r] and v_lines[c]
+    '''
+    return intersections(order_lines(h_lines, True), order_lines(v_lines, False))
+
+
+def rounded(points):
+    '''
+    Closest integer pixel locations
+    '''
+    return np.round(points).astype(np.int64)
+
+
+def corners(points):
+    '''
+    Outer corners of a grid of points
+    returns ... tl, tr, br, bl
+    '''
+    return points[0, 0], points[0, -1], points[-1, -1], points[-1, 0]
+
+
+def inside(points, shape):
+    '''
+    Mask of the points that fall within an image of the given shape, borders included
+    '''
+    with np.errstate(invalid = 'ignore'):
+        return (points[..., 0] >= 0) & (points[..., 0] <= shape[1]) & (points[..., 1] >= 0) & (points[..., 1] <= shape[0])
@@ -0,0 +1,144 @@
+'''
+Background capture of the camera stream.
+
+A thread keeps pulling frames from the robot into a small ring buffer that is
+allocated once, every slot tagged with the capture time and a sequence number.
+Readers get a copy of the newest frame right away, or wait for a frame captured
+after a given time, instead of paying the network round-trip on every look.
+The thread is paced to the frame rate of the camera subscription and drops a frame
+whose camera timestamp it has already seen, so waiting readers only wake up on new frames.
+'''
+
+import threading
+import time
+
+import cv2 as cv
+import numpy as np
+
+from config import xo_config_capture_slots, xo_config_camera_fps
+
+# ALVideoDevice color spaces with three 8-bit channels
+COLOR_SPACE_RGB = 11
+COLOR_SPACE_BGR = 13
+
+# ALVideoDevice resolutions, index -> (width, height)
+RESOLUTIONS = {0: (160, 120), 1: (320, 240), 2: (640, 480), 3: (1280, 960), 4: (2560, 1920)}
+
+
+def decode_frame(nao_image, color_space = COLOR_SPACE_BGR, out = None):
+    '''
+    Turn an ALVideoDevice image into a C-contiguous BGR frame without copying the pixels more than needed
+    - nao_image ... result of getImageRemote, [0] width, [1] height, [6] pixel payload
+    - color_space ... color space the camera was subscribed with, BGR needs no channel flip
+    - out ... optional preallocated (height, width, 3) uint8 array the frame is written into
+    returns ... read-only view of the payload if BGR and no out is given, otherwise out or a new array
+    '''
+    frame = np.frombuffer(nao_image[6], dtype = np.uint8).reshape((nao_image[1], nao_image[0], 3))
+    if color_space == COLOR_SPACE_RGB:
+        return cv.cvtColor(frame, cv.COLOR_RGB2BGR, dst = out)
+    if out is not None:
+        np.copyto(out, frame)
+        return out
+    return frame
+
+
+class CameraCapture:
+
+    def __init__(self, logging, grab, slots = xo_config_capture_slots, fps = xo_config_camera_fps):
+        '''
+        - grab ... function returning the next camera frame as a (height, width, 3) uint8 array and its camera timestamp
+        - slots ... number of frames kept in the ring buffer, at least 2 so a frame is never read while written
+        - fps ... frame rate of the camera subscription, the camera isn't asked more often
+        '''
+        self.logger = logging
+        self.grab = grab
+        self.slots = max(2, slots)
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.last_stamp = None
+
+        self.frames = None
+        self.timestamps = np.zeros(self.slots)
+        self.sequences = np.zeros(self.slots, dtype = np.int64)
+        self.sequence = 0
+
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target = self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        self.logger.debug("Camera capture thread started with %d slots", self.slots)
+
+
+    def run(self):
+        while not self.stop_event.is_set():
+            started = time.time()
+            try:
+                frame, stamp = self.grab()
+            except Exception as e:
+                self.logger.warning("Camera frame couldn't be captured: %s", str(e).replace("\n", " "))
+                self.stop_event.wait(0.5)
+                continue
+            timestamp = time.time()
+
+            if stamp is not None and stamp == self.last_stamp:
+                # The camera hasn't delivered a new frame yet, ask again a bit later to get back in step with it
+                self.stop_event.wait(max(0.0, self.interval / 4 - (timestamp - started)))
+                continue
+            self.last_stamp = stamp
+
+            if self.frames is None or self.frames.shape[1:] != frame.shape:
+                with self.condition:
+                    self.frames = np.empty((self.slots,) + frame.shape, dtype = np.uint8)
+                    self.sequence = 0
+
+            # The slot being written is never the newest one, readers only copy the newest
+            slot = self.sequence % self.slots
+            np.copyto(self.frames[slot], frame)
+
+            with self.condition:
+                self.timestamps[slot] = timestamp
+                self.sequences[slot] = self.sequence
+                self.sequence += 1
+                self.condition.notify_all()
+
+            self.stop_event.wait(max(0.0, self.interval - (time.time() - started)))
+
+
+    def latest(self, newer_than = None, timeout = None):
+        '''
+        Newest frame in the buffer
+        - newer_than ... optional time.time() value, wait for a frame captured after it
+        - timeout ... maximum wait in seconds, None waits as long as it takes
+        returns ... (frame copy, capture time, sequence number) or None if no such frame arrived in time
+        '''
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while not self.is_ready(newer_than):
+                remaining = None if deadline is None else deadline - time.time()
+                if (remaining is not None and remaining <= 0) or self.thread is None:
+                    return None
+                self.condition.wait(remaining)
+
+            slot = (self.sequence - 1) % self.slots
+            return self.frames[slot].copy(), self.timestamps[slot], int(self.sequences[slot])
+
+
+    def is_ready(self, newer_than):
+        if self.sequence == 0:
+            return False
+        return newer_than is None or self.timestamps[(self.sequence - 1) % self.slots] > newer_than
+
+
+    def close(self):
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        with self.condition:
+            self.thread = None
+            self.condition.notify_all()
@@ -0,0 +1,137 @@
+'''
+Precomputed color lookup table of the token colors.
+
+Every BGR color is quantized to xo_config_color_bits bits per channel, the table holds
+one label per quantized color (EMPTY, RED or BLUE), so labeling an image is a single
+fancy-indexing pass instead of an HSV conversion and several cv.inRange passes.
+The label of a quantized color is the majority label of all the 8-bit colors it stands for,
+derived from the HSV thresholds in config.py.
+
+The table is stored with np.save and memory-mapped on load, so it costs nothing at startup.
+Regenerate it whenever the HSV thresholds change for new lighting conditions.
+
+Usage:
+> python color_table.py generate     ... label every color from the HSV thresholds and write the table
+> python color_table.py verify       ... re-derive the table and diff it against the file
+'''
+
+import argparse
+import os
+import sys
+
+import cv2 as cv
+import numpy as np
+
+from config import xo_config_hsv_blue, xo_config_hsv_red, xo_config_color_table, xo_config_color_bits
+
+EMPTY = 0
+RED = 1
+BLUE = 2
+
+
+def hsv_labels(image, blue_ranges = xo_config_hsv_blue, red_ranges = xo_config_hsv_red):
+    '''
+    Exact per-pixel labels of a BGR image from the HSV thresholds, the reference the table is built from
+    returns ... uint8 array of the image size with EMPTY / RED / BLUE
+    '''
+    hsv = cv.cvtColor(image, cv.COLOR_BGR2HSV)
+    labels = np.zeros(image.shape[:2], dtype = np.uint8)
+    for ranges, label in [(red_ranges, RED), (blue_ranges, BLUE)]:
+        for low, high in ranges:
+            labels[cv.inRange(hsv, np.array(low), np.array(high)) > 0] = label
+    return labels
+
+
+def build_table(bits = xo_config_color_bits, blue_ranges = xo_config_hsv_blue, red_ranges = xo_config_hsv_red):
+    '''
+    Label every quantized color by a majority vote of the 8-bit colors it covers
+    returns ... (levels, levels, levels) uint8 array indexed by the quantized [b][g][r]
+    '''
+    levels = 1 << bits
+    shift = 8 - bits
+    votes = np.zeros(levels ** 3 * 3, dtype = np.int64)
+
+    # One 256x256 image of every green / red combination per blue value
+    green, red = np.meshgrid(np.arange(256, dtype = np.uint8), np.arange(256, dtype = np.uint8), indexing = 'ij')
+    plane = (green.astype(np.int64) >> shift) * levels + (red.astype(np.int64) >> shift)
+    for blue in range(256):
+        image = cv.merge([np.full_like(green, blue), green, red])
+        cells = (blue >> shift) * levels * levels + plane
+        votes += np.bincount((cells * 3 + hsv_labels(image, blue_ranges, red_ranges)).ravel(), minlength = votes.size)
+
+    return votes.reshape(-1, 3).argmax(axis = 1).astype(np.uint8).reshape(levels, levels, levels)
+
+
+def write_table(path, bits = xo_config_color_bits):
+    '''
+    Generate the table and store it atomically on disk
+    '''
+    table = build_table(bits)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, table)
+    os.rename(tmp_path, path)
+    return table
+
+
+def load_table(path = xo_config_color_table, bits = xo_config_color_bits, logging = None):
+    '''
+    Memory-map the table from disk, a missing or mismatching file is rebuilt in memory
+    '''
+    levels = 1 << bits
+    try:
+        table = np.load(path, mmap_mode = 'r')
+        if table.shape == (levels, levels, levels) and table.dtype == np.uint8:
+            return table
+        message = 'Color table ' + str(path) + ' does not match ' + str(bits) + ' bits per channel'
+    except (IOError, OSError, ValueError) as e:
+        message = 'Color table ' + str(path) + ' could not be loaded: ' + str(e)
+
+    if logging is not None:
+        logging.warning(message + ', building it in memory. Run "python color_table.py generate" to store it')
+    return build_table(bits)
+
+
+def classify(image, table):
+    '''
+    Label every pixel of a BGR image with the table
+    returns ... uint8 array of the image size with EMPTY / RED / BLUE
+    '''
+    bits = int(np.log2(table.shape[0]))
+    # 3 * bits wide, uint16 would overflow from 6 bits per channel on
+    quantized = (image >> (8 - bits)).astype(np.uint32)
+    index = (quantized[..., 0] << (2 * bits)) | (quantized[..., 1] << bits) | quantized[..., 2]
+    return np.asarray(table).ravel().take(index)
+
+
+def verify_table(path, bits = xo_config_color_bits):
+    '''
+    Compare the stored table with a freshly built one
+    returns ... list of the quantized colors with a different label
+    '''
+    stored = np.load(path, mmap_mode = 'r')
+    table = build_table(bits)
+    if stored.shape != table.shape:
+        return [(-1, -1, -1)]
+    return [tuple(color) for color in np.argwhere(stored != table)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Generate or verify the color lookup table.')
+    parser.add_argument('command', choices = ['generate', 'verify'])
+    parser.add_argument('--table', type = str, default = xo_config_color_table, help = 'Path of the table file')
+    parser.add_argument('--bits', type = int, default = xo_config_color_bits, help = 'Quantization bits per channel')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        table = write_table(args.table, args.bits)
+        counts = np.bincount(table.ravel(), minlength = 3)
+        print('Table with ' + str(counts[RED]) + ' red and ' + str(counts[BLUE]) + ' blue colors written to ' + args.table)
+    else:
+        mismatches = verify_table(args.table, args.bits)
+        for color in mismatches[:20]:
+            print('Mismatch at quantized BGR ' + str(color))
+        if mismatches:
+            print(str(len(mismatches)) + ' colors differ from the HSV thresholds')
+            sys.exit(1)
+        print('Table ' + args.table + ' matches the HSV thresholds')
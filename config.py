@@ -24,3 +24,99 @@ Run the following command to retrieve the intrinsic parameters. Use 8x8 chess bo
 """
 xo_config_intrinsic_parameters = [888.52, 859.38, 666.72, 652.96, 0]
 
+# ALVideoDevice resolution (2 = 640x480, 3 = 1280x960) and color space (13 = BGR, decoded without a channel flip)
+xo_config_camera_resolution = 2
+xo_config_camera_color_space = 13
+
+# Frame rate of the camera subscription, the capture thread doesn't ask the robot for frames more often
+xo_config_camera_fps = 5
+
+
+# Perfect-play table generated by "python game_table.py generate"
+xo_config_play_table = "game_table.bin"
+
+# Maximum number of positions kept in the search transposition cache, 0 disables the cache
+xo_config_cache_size = 50000
+
+# Search algorithm of the game control: "minimax" (matches the perfect-play table) or "alphabeta" (prefers faster wins)
+xo_config_search = "minimax"
+
+# Board size and number of tokens in a row needed to win, anything but 3 / 3 uses the generalized engine
+xo_config_board_size = 3
+xo_config_win_length = 3
+
+# Hard limit of the generalized engine's thinking time per move, in milliseconds
+xo_config_time_budget_ms = 2000
+
+# Number of best-looking moves searched per node on boards larger than 5x5, 0 searches all of them
+xo_config_max_branching = 12
+
+# Worker processes of the generalized engine, more than 1 splits the root moves across a process pool
+xo_config_search_workers = 1
+
+# Precompute the robot's replies to every possible human move while waiting for the human
+xo_config_pondering = True
+
+# Dashboard images written by a background thread, switch off to skip them altogether
+xo_config_dashboard_images = True
+xo_config_dashboard_path = "static/data"
+
+# Maximum number of dashboard images waiting to be written, older ones are dropped
+xo_config_dashboard_queue = 8
+
+# Highest frame rate of the dashboard's live image streams per browser, a browser may ask for less with ?fps=
+xo_config_stream_fps = 5
+
+# Number of the latest log records and game state changes kept for the dashboard's event stream, a reconnecting dashboard catches up from them
+xo_config_event_buffer = 1000
+
+# Camera frames pulled by a background thread into a ring buffer of this many slots, False reads the camera on demand
+xo_config_capture_thread = True
+xo_config_capture_slots = 4
+
+# Longest wait for a fresh camera frame in seconds before the camera is read directly
+xo_config_capture_timeout = 2.0
+
+# Change detection while waiting for the human: side of the grayscale thumbnail of a field in pixels,
+# mean gray level difference of a field against the last read board that counts as a change,
+# difference between consecutive frames still considered steady and seconds the scene has to stay steady
+xo_config_motion_tile = 16
+xo_config_motion_threshold = 12
+xo_config_settle_threshold = 4
+xo_config_settle_seconds = 0.6
+
+# Seconds after which the board is read in full even if no change was detected
+xo_config_recheck_interval = 10.0
+
+# Mean color change of a field (0-255 per channel) after which the field is classified again, the others keep their labels
+xo_config_signature_threshold = 8
+
+# HSV ranges (OpenCV hue 0-180) of the token colors, red wraps around the hue axis.
+# Run "python color_table.py generate" after changing them
+xo_config_hsv_blue = [((100, 100, 50), (135, 255, 255))]
+xo_config_hsv_red = [((0, 100, 100), (20, 255, 255)), ((155, 100, 100), (180, 255, 255))]
+
+# Color lookup table generated by "python color_table.py generate" and its quantization bits per channel (5 = 32x32x32 colors)
+xo_config_color_table = "color_table.npy"
+xo_config_color_bits = 5
+
+# Board detection: downscaling factor of the coarse blob search and the fraction of the minimum
+# blob size the coarse estimate has to reach before the full resolution analysis runs
+xo_config_detection_scale = 4
+xo_config_detection_coarse_ratio = 0.5
+
+# Board tracking: drift of the grid intersections in pixels that updates the board position, minimum number
+# of intersections followed for a valid pose and seconds without a good pose after which the board is searched again
+xo_config_tracking_drift = 1.5
+xo_config_tracking_min_points = 8
+xo_config_tracking_lost_seconds = 3.0
+
+# Frames tried to confirm the board position before every new game, the full board search runs if none of them does
+xo_config_session_pose_frames = 10
+
+# Start the next game by itself once a game is over and the board has been cleared, False waits for the API
+xo_config_session_autostart = True
+
+# Line merging: Hough lines closer than this fraction of the image size and this angle in radians belong to one board line
+xo_config_line_merge_distance = 0.03
+xo_config_line_merge_angle = 0.2
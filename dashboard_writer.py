@@ -0,0 +1,132 @@
+'''
+Background writer of the dashboard images.
+
+The vision code hands its intermediate images to submit() and carries on; the
+JPEG encoding and the disk writes happen on a separate thread. Only the newest
+image of every name is kept: if the writer falls behind, a stale frame still
+waiting in the queue is replaced by the new one instead of being written. Files
+are written to a temporary name and renamed, so the dashboard never reads a
+half-written image. Every encoded image is also published to a FrameStream,
+the dashboard's live MJPEG streams reuse it instead of encoding it again.
+'''
+
+import atexit
+import os
+import threading
+from collections import OrderedDict
+
+import cv2 as cv
+
+from frame_stream import FrameStream
+from config import xo_config_dashboard_images, xo_config_dashboard_path, xo_config_dashboard_queue
+
+
+class DashboardWriter:
+
+    def __init__(self, logging, enabled = xo_config_dashboard_images, path = xo_config_dashboard_path, max_pending = xo_config_dashboard_queue):
+        self.logger = logging
+        self.enabled = enabled
+        self.path = path
+        self.max_pending = max_pending
+
+        self.pending = OrderedDict()
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.stream = FrameStream() if enabled else None
+
+        self.written = 0
+        self.dropped = 0
+
+        if self.enabled:
+            self.start()
+
+
+    def start(self):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        self.running = True
+        self.thread = threading.Thread(target = self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+        # Finish the pending writes before the interpreter tears the modules down
+        atexit.register(self.close)
+        self.logger.debug("Dashboard writer started, images go to %s", str(self.path))
+
+
+    def submit(self, name, img, render = None):
+        '''
+        Queue an image for the dashboard, never blocks
+        - name ... file name within the dashboard folder, e.g. "raw_image.jpg"
+        - img ... image to store, it must not be modified by the caller afterwards
+        - render ... optional function applied to img on the writer thread, for images only drawn for the dashboard
+        returns ... True if the image was queued
+        '''
+        if not self.running:
+            return False
+
+        with self.condition:
+            if name in self.pending:
+                # The older frame of the same image hasn't been written yet and isn't worth writing any more
+                del self.pending[name]
+                self.dropped += 1
+            elif len(self.pending) >= self.max_pending:
+                self.pending.popitem(last = False)
+                self.dropped += 1
+            self.pending[name] = (img, render)
+            self.condition.notify()
+        return True
+
+
+    def watched(self, name):
+        '''
+        True if a browser follows the live stream of the image
+        '''
+        return self.stream is not None and self.stream.watched(name)
+
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                name, (img, render) = self.pending.popitem(last = False)
+
+            try:
+                if render is not None:
+                    img = render(img)
+                self.write(name, img)
+                self.written += 1
+            except Exception as e:
+                self.logger.warning("Dashboard image %s couldn't be written: %s", str(name), str(e))
+
+
+    def write(self, name, img):
+        ok, data = cv.imencode(os.path.splitext(name)[1], img)
+        if not ok:
+            raise ValueError("Encoding failed")
+        data = data.tobytes()
+        self.stream.publish(name, data)
+
+        target = os.path.join(self.path, name)
+        tmp_target = target + '.tmp'
+        with open(tmp_target, 'wb') as f:
+            f.write(data)
+        os.rename(tmp_target, target)
+
+
+    def close(self):
+        '''
+        Write out the images still waiting and stop the thread
+        '''
+        if self.thread is None:
+            return
+        self.stream.close()
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+        self.thread = None
@@ -0,0 +1,100 @@
+'''
+Server-Sent Events of the log records and the game state.
+
+EventLog keeps the latest events in a ring buffer, each with a growing id. The log
+handler and the game push events into it without waiting for anybody; every dashboard
+connected to /api/events runs its own generator that sends what it hasn't seen yet.
+A reconnecting EventSource sends the id of the last event it received (Last-Event-ID)
+and the stream resumes right after it, as far as the buffer reaches back.
+'''
+
+import json
+import logging
+import threading
+from collections import deque
+
+from config import xo_config_event_buffer
+
+KEEPALIVE = b': keepalive\n\n'
+
+
+def plain(value):
+    '''
+    JSON fallback for NumPy scalars and arrays in the published state
+    '''
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+class EventLog:
+
+    def __init__(self, size = xo_config_event_buffer):
+        self.events = deque(maxlen = size)
+        self.last_id = 0
+        self.condition = threading.Condition()
+        self.running = True
+
+
+    def publish(self, event, data):
+        '''
+        Append an event, it's serialized once here for all the listeners
+        - event ... SSE event name, e.g. "log" or "state"
+        - data ... any JSON serializable object, sent on a single data line
+        returns ... id of the event
+        '''
+        data = json.dumps(data, default = plain)
+        with self.condition:
+            self.last_id += 1
+            message = 'id: {}\nevent: {}\ndata: {}\n\n'.format(self.last_id, event, data)
+            self.events.append((self.last_id, message.encode('utf-8')))
+            self.condition.notify_all()
+            return self.last_id
+
+
+    def messages(self, last_id = 0, timeout = 15.0):
+        '''
+        Generator of the SSE messages for one listener, a comment line keeps an idle connection open
+        - last_id ... id of the last event the listener has, 0 replays the whole buffer
+        - timeout ... seconds without events before a keep-alive is sent
+        '''
+        if last_id > self.last_id:
+            # The ids of a restarted server start over, an id from the old process means everything is new
+            last_id = 0
+        while self.running:
+            with self.condition:
+                if self.last_id == last_id:
+                    self.condition.wait(timeout)
+                pending = [(event_id, message) for event_id, message in self.events if event_id > last_id]
+
+            if not pending:
+                yield KEEPALIVE
+                continue
+            last_id = pending[-1][0]
+            yield b''.join(message for event_id, message in pending)
+
+
+    def close(self):
+        '''
+        End all the listener streams
+        '''
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+
+class EventHandler(logging.Handler):
+    '''
+    Logging handler publishing every formatted record as a "log" event
+    '''
+
+    def __init__(self, events, level = logging.NOTSET):
+        logging.Handler.__init__(self, level)
+        self.events = events
+
+
+    def emit(self, record):
+        try:
+            self.events.publish('log', self.format(record))
+        except Exception:
+            self.handleError(record)
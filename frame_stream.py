@@ -0,0 +1,101 @@
+'''
+Live MJPEG streams of the dashboard images.
+
+The dashboard writer publishes every image it encodes, so a frame is JPEG-encoded
+once no matter how many browsers watch it. publish() only swaps the latest encoded
+frame of a stream and wakes the viewers, it never waits for them. Every viewer runs
+its own frames() generator on its own server thread: it sends the newest frame,
+sleeps out its frame interval and skips whatever was published meanwhile, so a slow
+browser only ever falls behind itself.
+'''
+
+import threading
+import time
+
+from config import xo_config_stream_fps
+
+BOUNDARY = 'frame'
+
+
+class FrameStream:
+
+    def __init__(self, max_fps = xo_config_stream_fps):
+        self.max_fps = max_fps
+        self.frames = {}
+        self.viewers = {}
+        self.condition = threading.Condition()
+        self.running = True
+
+        self.published = 0
+
+
+    def publish(self, name, data):
+        '''
+        Replace the latest frame of a stream, never blocks on the viewers
+        - name ... stream name, the file name of the dashboard image, e.g. "raw_image.jpg"
+        - data ... encoded JPEG bytes
+        '''
+        with self.condition:
+            sequence = self.frames[name][1] + 1 if name in self.frames else 0
+            self.frames[name] = (data, sequence)
+            self.published += 1
+            self.condition.notify_all()
+
+
+    def latest(self, name):
+        '''
+        returns ... (encoded frame, sequence number) or None if nothing was published yet
+        '''
+        with self.condition:
+            return self.frames.get(name)
+
+
+    def watched(self, name):
+        '''
+        True if a browser is connected to the stream, to skip producing frames nobody looks at
+        '''
+        return self.viewers.get(name, 0) > 0
+
+
+    def frames_of(self, name, fps = None, timeout = 5.0):
+        '''
+        Generator of the multipart/x-mixed-replace parts for one viewer
+        - fps ... frame rate requested by the viewer, capped by max_fps
+        - timeout ... longest wait for a new frame before the latest one is sent again, keeps the connection alive
+        '''
+        fps = min(fps, self.max_fps) if fps and fps > 0 else self.max_fps
+        interval = 1.0 / fps
+        sequence = None
+
+        with self.condition:
+            self.viewers[name] = self.viewers.get(name, 0) + 1
+        try:
+            while self.running:
+                with self.condition:
+                    deadline = time.time() + timeout
+                    while self.running and (name not in self.frames or self.frames[name][1] == sequence) and time.time() < deadline:
+                        self.condition.wait(deadline - time.time())
+                    if not self.running or name not in self.frames:
+                        continue
+                    data, sequence = self.frames[name]
+
+                sent = time.time()
+                yield self.part(data)
+                time.sleep(max(0.0, interval - (time.time() - sent)))
+        finally:
+            with self.condition:
+                self.viewers[name] -= 1
+
+
+    def part(self, data):
+        return b''.join([b'--', BOUNDARY.encode('ascii'), b'\r\nContent-Type: image/jpeg\r\nContent-Length: ',
+                         str(len(data)).encode('ascii'), b'\r\n\r\n', data, b'\r\n'])
+
+
+    def close(self):
+        '''
+        End all the viewer streams
+        '''
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
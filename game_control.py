@@ -1,8 +1,18 @@
 import time
+import threading
+import numpy as np
+from config import xo_config_play_table, xo_config_cache_size, xo_config_search
+from config import xo_config_board_size, xo_config_win_length, xo_config_time_budget_ms, xo_config_max_branching
+from config import xo_config_search_workers, xo_config_pondering
+from game_engine import BitboardEngine, AlphaBetaEngine, TranspositionTable, FULL_MASK, encode, count_bits
+from game_table import PlayTable, build_table, evaluate_batch, outcome_score
+from game_kinarow import LineBoard, KInARowEngine
 
 class GameControl:  
 
-    def __init__(self, logging):
+    def __init__(self, logging, table = xo_config_play_table, cache_size = xo_config_cache_size, search = xo_config_search,
+                 size = xo_config_board_size, k = xo_config_win_length, time_budget_ms = xo_config_time_budget_ms,
+                 workers = xo_config_search_workers, pondering = xo_config_pondering):
         self.max = 10
         self.robot = +1
         self.tie = 0
@@ -10,8 +20,43 @@ class GameControl:
         self.human = -1
         
         self.logger = logging
+        self.size = size
+        self.k = k
 
-        self.board = [ [0, 0, 0], [0, 0, 0], [0, 0, 0] ]
+        # Any board but the classic 3x3 runs on the generalized, time-bounded engine
+        self.kinarow = None
+        if size != 3 or k != 3:
+            max_branching = xo_config_max_branching if size > 5 else None
+            self.kinarow = KInARowEngine(size, k, time_budget_ms, max_branching, workers)
+
+        self.cache = TranspositionTable(cache_size) if cache_size else None
+        if search == "minimax":
+            self.engine = BitboardEngine(self.max, self.min, self.cache)
+        elif search == "alphabeta":
+            self.engine = AlphaBetaEngine(self.max, self.min, self.cache)
+        else:
+            raise ValueError("Unknown search algorithm: " + str(search))
+
+        # Perfect-play lookup table, it holds minimax results and the search is only used as a fallback
+        self.table = None
+        if table and search == "minimax":
+            try:
+                self.table = PlayTable(table)
+                self.logger.debug("Perfect-play table loaded from %s", str(table))
+            except (IOError, OSError, ValueError) as e:
+                self.logger.warning("Perfect-play table %s couldn't be loaded, moves will be searched: %s", str(table), str(e))
+
+        # Background search of the replies during the human's turn, guarded by search_lock
+        self.pondering = pondering
+        self.search_lock = threading.Lock()
+        self.ponder_thread = None
+        self.ponder_stop = None
+        self.ponder_results = {}
+
+        # In-memory table for evaluate_batch() when no table file is loaded
+        self.batch_entries = None
+
+        self.board = [ [0] * size for row in range(size) ]
         self.logger.debug("Game control initialized")
 
 
@@ -20,8 +65,17 @@ class GameControl:
         # Check if the game hasn't ended by human's move
         cur_status = self.evaluate_board(board)
         if cur_status == None:
-            depth = len(self.empty_cells(board))
-            move = self.minimax(board, depth, self.robot)
+            # Whatever the human played, the pondered position is stale from now on
+            pondered = self.ponder_results.get(self.board_key(board))
+            self.stop_pondering()
+
+            if pondered is not None:
+                score, cell = pondered
+                self.logger.debug("Pondered reply found for the current board")
+            else:
+                with self.search_lock:
+                    score, cell = self.find_move(board)
+            move = [cell // self.size, cell % self.size, score]
             
             # Evaluate also the status after robot's move
             board[move[0]][move[1]] = self.robot
@@ -33,14 +87,154 @@ class GameControl:
             return [None, None, cur_status]
 
 
+    def evaluate_batch(self, boards):
+        '''
+        Score many positions at once with the robot to move, without modifying them
+        - boards ... (N, 3, 3) int8 NumPy array of boards or (N,) array of packed position indices (see game_table.position_index)
+        return ... (moves, outcomes) arrays: best cell index in row-major order (-1 if the game is over)
+                   and the result under perfect play (+1 robot wins, -1 human wins, 0 tie)
+        '''
+        if self.kinarow is not None:
+            raise ValueError("Batch evaluation is only available for the 3x3 board")
+
+        if self.table is not None:
+            entries = self.table.array()
+        else:
+            if self.batch_entries is None:
+                self.batch_entries = np.frombuffer(build_table(), dtype = np.uint8)
+            entries = self.batch_entries
+
+        return evaluate_batch(entries, boards)
+
+
+    def ponder(self, board):
+        '''
+        Start precomputing the robot's replies to every possible human move in the background.
+        play() picks the reply up if the human makes one of the pondered moves.
+        - board ... current state of the board with the human to move, it is not modified
+        '''
+        self.stop_pondering()
+        if not self.pondering or self.evaluate_board(board) != None:
+            return
+
+        self.ponder_stop = threading.Event()
+        self.ponder_thread = threading.Thread(target = self.ponder_replies, args = ([row[:] for row in board], self.ponder_stop))
+        self.ponder_thread.daemon = True
+        self.ponder_thread.start()
+
+
+    def stop_pondering(self):
+        '''
+        Cancel the background search and forget its results
+        '''
+        if self.ponder_thread is not None:
+            self.ponder_stop.set()
+            self.ponder_thread.join()
+            self.ponder_thread = None
+        self.ponder_results = {}
+
+
+    def ponder_replies(self, board, stop):
+        '''
+        Background thread body, searches the most likely human moves first
+        '''
+        moves = [r * self.size + c for r in range(self.size) for c in range(self.size) if board[r][c] == 0]
+        if self.kinarow is not None:
+            line_board = LineBoard.from_rows(board, self.k)
+            moves = line_board.candidates()
+            moves.sort(key = lambda cell: -line_board.priority(cell, self.human))
+
+        for cell in moves:
+            row, col = cell // self.size, cell % self.size
+            board[row][col] = self.human
+            if self.evaluate_board(board) == None:
+                with self.search_lock:
+                    if stop.is_set():
+                        return
+                    result = self.find_move(board, stop)
+
+                # A search cut short by the cancellation is not a valid answer
+                if stop.is_set():
+                    return
+                self.ponder_results[self.board_key(board)] = result
+            board[row][col] = 0
+
+        self.logger.debug("Pondering completed, %d replies prepared", len(self.ponder_results))
+
+
+    def new_game(self):
+        '''
+        Forget the previous game, the play table and the search cache are kept
+        '''
+        self.stop_pondering()
+        self.board = [ [0] * self.size for row in range(self.size) ]
+
+
+    def board_key(self, board):
+        return tuple(tuple(row) for row in board)
+
+
+    def close(self):
+        '''
+        Release the search worker processes and the memory-mapped table
+        '''
+        self.stop_pondering()
+        if self.kinarow is not None:
+            self.kinarow.close()
+        if self.table is not None:
+            self.table.close()
+            self.table = None
+
+
     ## -------------------------------------------------------------
     #    SUPPORTING FUNCTIONS
     ## -------------------------------------------------------------
-    
+
+    def find_move(self, board, stop = None):
+        '''
+        Find the robot's best move on a list-of-lists board
+        - stop ... optional threading.Event that cuts the generalized search short
+        return ... (best score, best cell index in row-major order)
+        '''
+        if self.kinarow is not None:
+            result = self.kinarow.best_move(LineBoard.from_rows(board, self.k), self.robot, None, stop)
+            self.logger.debug("Search completed depth %d, %d nodes", self.kinarow.completed_depth, self.kinarow.nodes)
+            return result
+
+        robot_bits, human_bits = encode(board, self.robot, self.human)
+        return self.best_move(robot_bits, human_bits)
+
+
+    def best_move(self, robot_bits, human_bits):
+        '''
+        Find the robot's best move, from the perfect-play table when available
+        return ... (best score, best cell index)
+        '''
+        if self.table is not None:
+            entry = self.table.lookup(robot_bits, human_bits)
+            if entry is not None:
+                return outcome_score(entry[1], self.max, self.min), entry[0]
+
+        depth = 9 - count_bits(robot_bits | human_bits)
+        result = self.engine.minimax(robot_bits, human_bits, depth, self.robot)
+        if self.cache is not None:
+            self.logger.debug("Search cache: %s", str(self.cache.stats()))
+        return result
+
+
     def evaluate_board(self, board):
-        depth = len(self.empty_cells(board))
-        evaluate_state = self.is_win(board)
-        if depth == 0 or evaluate_state:
+        if self.kinarow is not None:
+            line_board = LineBoard.from_rows(board, self.k)
+            winner = line_board.winner()
+            if winner:
+                return winner
+            elif line_board.empty == 0:
+                return self.tie
+            return None
+
+        robot_bits, human_bits = encode(board, self.robot, self.human)
+        evaluate_state = self.engine.is_win(robot_bits, human_bits)
+        if (robot_bits | human_bits) == FULL_MASK or evaluate_state:
             if evaluate_state == self.max:
                 return self.robot
             elif evaluate_state == self.min:
@@ -55,24 +249,16 @@ class GameControl:
         - state ... the state of the current board
         return ... winner represenation if game over, or false if nots
         '''
-        win_state = [
-            [board[0][0], board[0][1], board[0][2]],
-            [board[1][0], board[1][1], board[1][2]],
-            [board[2][0], board[2][1], board[2][2]],
-            [board[0][0], board[1][0], board[2][0]],
-            [board[0][1], board[1][1], board[2][1]],
-            [board[0][2], board[1][2], board[2][2]],
-            [board[0][0], board[1][1], board[2][2]],
-            [board[2][0], board[1][1], board[0][2]],
-        ]
-
-        if [self.robot, self.robot, self.robot] in win_state:
-            return self.max
-        elif [self.human, self.human, self.human] in win_state:
-            return self.min
-        else:
+        if self.kinarow is not None:
+            winner = LineBoard.from_rows(board, self.k).winner()
+            if winner == self.robot:
+                return self.max
+            elif winner == self.human:
+                return self.min
             return False
 
+        return self.engine.is_win(*encode(board, self.robot, self.human))
+
 
     def empty_cells(self, board):
         '''
@@ -91,40 +277,20 @@ class GameControl:
 
     def minimax(self, state, depth, player):
         '''
-        Main algorithm for planning the next move
+        Main algorithm for planning the next move, the search itself runs on bitboards (see game_engine)
         - state ... current state of the game
         - depth ... index of the node in the decision tree
         - player ... whose turn it is, +1 for robot's turn, -1 for oponent
         returns ... a list with [the best row, best col, best score]
         '''
-        
-        # Both players start with your worst score
-        if player == self.robot:
-            best = [-1, -1, -1000]
+        if self.kinarow is not None:
+            score, cell = self.kinarow.best_move(LineBoard.from_rows(state, self.k), player, depth)
         else:
-            best = [-1, -1, +1000]
-        
-        # No more open fields or game over
-        evaluate_state = self.is_win(state)
-        if depth == 0 or evaluate_state:
-            return [-1, -1, evaluate_state]
-
-        # Loop over empty cells
-        for cell in self.empty_cells(state):
-            x, y = cell[0], cell[1]
-            state[x][y] = player
-            score = self.minimax(state, depth-1, -player)
-            state[x][y] = 0
-            score[0], score[1] = x, y
-
-            if player == self.robot:
-                if score[2] > best[2]:
-                    best = score  # max value
-            else:
-                if score[2] < best[2]:
-                    best = score # min value
-
-        return best
+            robot_bits, human_bits = encode(state, self.robot, self.human)
+            score, cell = self.engine.minimax(robot_bits, human_bits, depth, player)
+        if cell == -1:
+            return [-1, -1, score]
+        return [cell // self.size, cell % self.size, score]
 
 
     def render(self, state):
@@ -132,7 +298,7 @@ class GameControl:
         Print the board on console
         :param state: current state of the board
         """
-        str_line = '---------------'
+        str_line = '-----' * len(state)
 
         print(str_line)
         for row in state:
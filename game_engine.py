@@ -0,0 +1,417 @@
+'''
+Bitboard representation of the tic-tac-toe board.
+
+Each side is stored as a 9-bit integer where cell [row][col] maps to bit row*3 + col.
+Win checks are a handful of mask ANDs and legal moves are produced by scanning the
+lowest set bit of the empty mask, so the search never allocates lists per node.
+Positions are cached under their canonical form, the smallest encoding over the
+8 rotations and reflections of the board (the D4 symmetry group).
+'''
+
+from collections import OrderedDict
+
+FULL_MASK = 0x1FF
+
+WIN_MASKS = (
+    0x007, 0x038, 0x1C0,    # rows
+    0x049, 0x092, 0x124,    # columns
+    0x111, 0x054,           # diagonals
+)
+
+
+def has_line(bits):
+    '''
+    Function to check if a side owns a complete line
+    - bits ... 9-bit mask of the cells owned by one side
+    return ... True if any of the eight winning masks is fully covered
+    '''
+    for mask in WIN_MASKS:
+        if bits & mask == mask:
+            return True
+    return False
+
+
+# Pre-evaluated has_line() for every possible mask, the search only does a tuple lookup
+WINNING = tuple(has_line(bits) for bits in range(FULL_MASK + 1))
+
+# Lowest set bit -> cell index
+CELL_OF = dict((1 << cell, cell) for cell in range(9))
+
+# The 8 symmetries of the board as cell permutations, SYMMETRIES[t][cell] is the image of cell
+SYMMETRIES = tuple(
+    tuple(r * 3 + c for r, c in [transform(cell // 3, cell % 3) for cell in range(9)])
+    for transform in (
+        lambda r, c: (r, c),            # identity
+        lambda r, c: (c, 2 - r),        # rotation by 90 degrees
+        lambda r, c: (2 - r, 2 - c),    # rotation by 180 degrees
+        lambda r, c: (2 - c, r),        # rotation by 270 degrees
+        lambda r, c: (r, 2 - c),        # mirror left-right
+        lambda r, c: (2 - r, c),        # mirror up-down
+        lambda r, c: (c, r),            # main diagonal
+        lambda r, c: (2 - c, 2 - r),    # anti-diagonal
+    )
+)
+INVERSE = tuple(tuple(perm.index(cell) for cell in range(9)) for perm in SYMMETRIES)
+
+# Every 9-bit mask under every symmetry, TRANSFORMED[t][bits]
+TRANSFORMED = tuple(
+    tuple(sum(1 << perm[cell] for cell in range(9) if bits >> cell & 1) for bits in range(FULL_MASK + 1))
+    for perm in SYMMETRIES
+)
+
+
+def encode(board, robot = +1, human = -1):
+    '''
+    Convert the list-of-lists board into a pair of bitboards
+    - board ... 3x3 list with +1 / -1 / 0 values
+    return ... (robot_bits, human_bits)
+    '''
+    robot_bits = 0
+    human_bits = 0
+    bit = 1
+    for row in board:
+        for cell in row:
+            if cell == robot:
+                robot_bits |= bit
+            elif cell == human:
+                human_bits |= bit
+            bit <<= 1
+
+    return robot_bits, human_bits
+
+
+def decode(robot_bits, human_bits, robot = +1, human = -1):
+    '''
+    Convert a pair of bitboards back into the list-of-lists board
+    '''
+    board = [[0, 0, 0], [0, 0, 0], [0, 0, 0]]
+    for cell in range(9):
+        if robot_bits >> cell & 1:
+            board[cell // 3][cell % 3] = robot
+        elif human_bits >> cell & 1:
+            board[cell // 3][cell % 3] = human
+
+    return board
+
+
+def count_bits(bits):
+    '''
+    Population count of a 9-bit mask
+    '''
+    return bin(bits).count('1')
+
+
+def canonical(robot_bits, human_bits):
+    '''
+    Canonical encoding of a position over the D4 symmetry group
+    return ... (smallest robot_bits << 9 | human_bits over all symmetries, index of the symmetry producing it)
+    '''
+    best_key = -1
+    best_sym = 0
+    for sym, table in enumerate(TRANSFORMED):
+        key = table[robot_bits] << 9 | table[human_bits]
+        if best_key < 0 or key < best_key:
+            best_key, best_sym = key, sym
+
+    return best_key, best_sym
+
+
+def reachable_positions():
+    '''
+    Walk the game tree from the empty board with either side starting and collect every legal position.
+    Positions where the game is over are included but not expanded.
+    return ... a set of (robot_bits, human_bits) tuples
+    '''
+    seen = set()
+    positions = set()
+    stack = [(0, 0, +1), (0, 0, -1)]
+    while stack:
+        robot_bits, human_bits, player = stack.pop()
+        key = (robot_bits, human_bits, player)
+        if key not in seen:
+            seen.add(key)
+            positions.add((robot_bits, human_bits))
+            if WINNING[robot_bits] or WINNING[human_bits]:
+                continue
+
+            empty = ~(robot_bits | human_bits) & FULL_MASK
+            while empty:
+                low = empty & -empty
+                empty ^= low
+                if player == +1:
+                    stack.append((robot_bits | low, human_bits, -1))
+                else:
+                    stack.append((robot_bits, human_bits | low, +1))
+
+    return positions
+
+
+class TranspositionTable:
+    '''
+    Size bounded cache of searched positions with least-recently-used eviction.
+    Keys are canonical positions, values are (score, best cell in the canonical orientation).
+    '''
+
+    def __init__(self, max_size = None):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def get(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        # Re-insert to mark the entry as most recently used
+        self.entries[key] = entry
+        self.hits += 1
+        return entry
+
+
+    def put(self, key, entry):
+        self.entries.pop(key, None)
+        self.entries[key] = entry
+        if self.max_size is not None and len(self.entries) > self.max_size:
+            self.entries.popitem(last = False)
+            self.evictions += 1
+
+
+    def clear(self):
+        self.entries.clear()
+
+
+    def stats(self):
+        '''
+        Cache counters for logging and benchmarks
+        '''
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+        }
+
+
+class BitboardEngine:
+    '''
+    Exhaustive minimax over bitboards. Results (scores and tie-breaking between equal
+    moves) are identical to the original list based GameControl.minimax.
+    An optional TranspositionTable lets the search reuse results of symmetric and transposed positions.
+    '''
+
+    def __init__(self, max_score = 10, min_score = -10, cache = None):
+        self.max = max_score
+        self.min = min_score
+        self.cache = cache
+        self.nodes = 0
+
+
+    def is_win(self, robot_bits, human_bits):
+        '''
+        Function to determine the winner
+        return ... max score if robot has a line, min score if human has a line, False otherwise
+        '''
+        if WINNING[robot_bits]:
+            return self.max
+        elif WINNING[human_bits]:
+            return self.min
+        return False
+
+
+    def minimax(self, robot_bits, human_bits, depth, player):
+        '''
+        Main algorithm for planning the next move
+        - robot_bits, human_bits ... current state of the game
+        - depth ... number of plies left to search
+        - player ... whose turn it is, +1 for robot's turn, -1 for oponent
+        returns ... (best score, best cell index or -1)
+        '''
+        # The root is always expanded so that its move follows the row-major tie-breaking,
+        # a cached move of a symmetric position would be just as good but may differ
+        return self.search(robot_bits, human_bits, depth, player, False)
+
+
+    def search(self, robot_bits, human_bits, depth, player, probe):
+        '''
+        Recursive part of minimax
+        - probe ... True to return a cached result for this node
+        '''
+        self.nodes += 1
+
+        # No more open fields or game over
+        if WINNING[robot_bits]:
+            return self.max, -1
+        if WINNING[human_bits]:
+            return self.min, -1
+        if depth == 0:
+            return 0, -1
+
+        cache = self.cache
+        if cache is not None:
+            key, sym = canonical(robot_bits, human_bits)
+            key = (key, depth, player)
+            if probe:
+                entry = cache.get(key)
+                if entry is not None:
+                    if entry[1] < 0:
+                        return entry[0], -1
+                    return entry[0], INVERSE[sym][entry[1]]
+
+        # Both players start with your worst score
+        best_cell = -1
+        if player == +1:
+            best = -1000
+        else:
+            best = +1000
+
+        # Loop over empty cells, lowest bit first to keep the row-major order of the original search
+        empty = ~(robot_bits | human_bits) & FULL_MASK
+        while empty:
+            low = empty & -empty
+            empty ^= low
+
+            if player == +1:
+                score = self.search(robot_bits | low, human_bits, depth - 1, -1, True)[0]
+                if score > best:
+                    best, best_cell = score, CELL_OF[low]
+            else:
+                score = self.search(robot_bits, human_bits | low, depth - 1, +1, True)[0]
+                if score < best:
+                    best, best_cell = score, CELL_OF[low]
+
+        if cache is not None:
+            cache.put(key, (best, SYMMETRIES[sym][best_cell] if best_cell >= 0 else -1))
+
+        return best, best_cell
+
+
+# Cache entry bound types of the alpha-beta search
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Static move ordering: center, corners, edges
+STATIC_ORDER = (4, 0, 2, 6, 8, 1, 3, 5, 7)
+
+
+class AlphaBetaEngine(BitboardEngine):
+    '''
+    Alpha-beta variant of the bitboard search.
+    Moves are tried in the order cached best move, killer moves, history score and finally
+    center / corners / edges. Wins are scored by the remaining depth (max + depth, min - depth),
+    so the robot prefers the fastest win and the slowest loss.
+    Cache entries hold (score, canonical cell, bound type).
+    '''
+
+    def __init__(self, max_score = 10, min_score = -10, cache = None):
+        BitboardEngine.__init__(self, max_score, min_score, cache)
+        self.killers = [[-1, -1] for depth in range(10)]
+        self.history = {+1: [0] * 9, -1: [0] * 9}
+
+
+    def minimax(self, robot_bits, human_bits, depth, player):
+        '''
+        Main algorithm for planning the next move
+        - robot_bits, human_bits ... current state of the game
+        - depth ... number of plies left to search
+        - player ... whose turn it is, +1 for robot's turn, -1 for oponent
+        returns ... (best score including the depth term, best cell index or -1)
+        '''
+        return self.alphabeta(robot_bits, human_bits, depth, player, -1000, +1000)
+
+
+    def order_moves(self, empty, depth, player, first):
+        '''
+        Sort the empty cells so that the moves most likely to cause a cut-off come first
+        '''
+        killers = self.killers[depth]
+        history = self.history[player]
+        moves = [cell for cell in STATIC_ORDER if empty >> cell & 1]
+        moves.sort(key = lambda cell: (cell != first, cell not in killers, -history[cell]))
+        return moves
+
+
+    def store_cutoff(self, depth, player, cell):
+        killers = self.killers[depth]
+        if killers[0] != cell:
+            killers[1] = killers[0]
+            killers[0] = cell
+        self.history[player][cell] += depth * depth
+
+
+    def alphabeta(self, robot_bits, human_bits, depth, player, alpha, beta):
+        '''
+        Recursive alpha-beta search, scores are always from the robot's point of view
+        '''
+        self.nodes += 1
+
+        # No more open fields or game over
+        if WINNING[robot_bits]:
+            return self.max + depth, -1
+        if WINNING[human_bits]:
+            return self.min - depth, -1
+        empty = ~(robot_bits | human_bits) & FULL_MASK
+        if depth == 0 or not empty:
+            return 0, -1
+
+        alpha_orig, beta_orig = alpha, beta
+        first = -1
+
+        cache = self.cache
+        if cache is not None:
+            key, sym = canonical(robot_bits, human_bits)
+            key = (key, depth, player)
+            entry = cache.get(key)
+            if entry is not None:
+                score, cell, bound = entry
+                cell = INVERSE[sym][cell] if cell >= 0 else -1
+                if bound == EXACT:
+                    return score, cell
+                elif bound == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score, cell
+                first = cell
+
+        # Both players start with your worst score
+        best_cell = -1
+        if player == +1:
+            best = -1000
+        else:
+            best = +1000
+
+        for cell in self.order_moves(empty, depth, player, first):
+            bit = 1 << cell
+            if player == +1:
+                score = self.alphabeta(robot_bits | bit, human_bits, depth - 1, -1, alpha, beta)[0]
+                if score > best:
+                    best, best_cell = score, cell
+                alpha = max(alpha, best)
+            else:
+                score = self.alphabeta(robot_bits, human_bits | bit, depth - 1, +1, alpha, beta)[0]
+                if score < best:
+                    best, best_cell = score, cell
+                beta = min(beta, best)
+
+            if alpha >= beta:
+                self.store_cutoff(depth, player, cell)
+                break
+
+        if cache is not None:
+            if best <= alpha_orig:
+                bound = UPPER
+            elif best >= beta_orig:
+                bound = LOWER
+            else:
+                bound = EXACT
+            cache.put(key, (best, SYMMETRIES[sym][best_cell], bound))
+
+        return best, best_cell
@@ -0,0 +1,489 @@
+'''
+Generalized N x N, k-in-a-row engine for boards larger than the classic 3 x 3.
+
+LineBoard keeps, for every window of k cells (rows, columns and both diagonals), the number
+of robot and human tokens inside it. Placing or removing a token only touches the windows
+through that cell, so wins and the heuristic score are maintained incrementally.
+KInARowEngine runs an iterative deepening alpha-beta search on top of it and stops when the
+per-move time budget runs out, returning the best move found so far.
+With more than one worker the root moves are split across a process pool: the first
+(young brothers wait) move is searched locally, the rest in parallel with a bound that the
+workers share through a multiprocessing.Value and re-read while they search.
+'''
+
+import copy
+import multiprocessing
+import time
+
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+class LineBoard:
+    '''
+    Board with incrementally maintained line counts
+    - size ... number of rows / columns
+    - k ... number of tokens in a row required to win
+    '''
+
+    def __init__(self, size, k):
+        self.size = size
+        self.k = k
+        self.cells = [0] * (size * size)
+        self.empty = size * size
+
+        # All windows of k cells and the windows passing through each cell
+        self.lines = []
+        for row in range(size):
+            for col in range(size):
+                for d_row, d_col in DIRECTIONS:
+                    end_row = row + d_row * (k - 1)
+                    end_col = col + d_col * (k - 1)
+                    if 0 <= end_row < size and 0 <= end_col < size:
+                        self.lines.append(tuple((row + d_row * i) * size + col + d_col * i for i in range(k)))
+
+        self.cell_lines = [[] for cell in self.cells]
+        for index, line in enumerate(self.lines):
+            for cell in line:
+                self.cell_lines[cell].append(index)
+
+        # Neighbouring cells, used to limit the candidate moves on larger boards
+        self.neighbours = []
+        for cell in range(size * size):
+            row, col = divmod(cell, size)
+            self.neighbours.append([r * size + c
+                for r in range(max(0, row - 1), min(size, row + 2))
+                for c in range(max(0, col - 1), min(size, col + 2))
+                if (r, c) != (row, col)])
+        self.near = [0] * (size * size)
+
+        self.robot_count = [0] * len(self.lines)
+        self.human_count = [0] * len(self.lines)
+        self.robot_lines = 0
+        self.human_lines = 0
+
+        # Heuristic value of a window by (robot tokens, human tokens), only open windows count
+        weights = [0] + [10 ** (i - 1) for i in range(1, k + 1)]
+        self.value = [[(weights[r] if h == 0 else 0) - (weights[h] if r == 0 else 0) for h in range(k + 1)] for r in range(k + 1)]
+        self.weights = weights
+        self.score = 0
+
+
+    @classmethod
+    def from_rows(cls, rows, k):
+        '''
+        Build a LineBoard from the list-of-lists representation used by GameControl
+        '''
+        board = cls(len(rows), k)
+        for r, row in enumerate(rows):
+            for c, value in enumerate(row):
+                if value != 0:
+                    board.place(r * board.size + c, value)
+        return board
+
+
+    def copy(self):
+        board = copy.copy(self)
+        board.cells = self.cells[:]
+        board.near = self.near[:]
+        board.robot_count = self.robot_count[:]
+        board.human_count = self.human_count[:]
+        return board
+
+
+    def place(self, cell, player):
+        self.cells[cell] = player
+        self.empty -= 1
+        value = self.value
+        k = self.k
+        for line in self.cell_lines[cell]:
+            r = self.robot_count[line]
+            h = self.human_count[line]
+            self.score -= value[r][h]
+            if player == +1:
+                r += 1
+                self.robot_count[line] = r
+                if r == k:
+                    self.robot_lines += 1
+            else:
+                h += 1
+                self.human_count[line] = h
+                if h == k:
+                    self.human_lines += 1
+            self.score += value[r][h]
+        for neighbour in self.neighbours[cell]:
+            self.near[neighbour] += 1
+
+
+    def remove(self, cell):
+        player = self.cells[cell]
+        self.cells[cell] = 0
+        self.empty += 1
+        value = self.value
+        k = self.k
+        for line in self.cell_lines[cell]:
+            r = self.robot_count[line]
+            h = self.human_count[line]
+            self.score -= value[r][h]
+            if player == +1:
+                if r == k:
+                    self.robot_lines -= 1
+                r -= 1
+                self.robot_count[line] = r
+            else:
+                if h == k:
+                    self.human_lines -= 1
+                h -= 1
+                self.human_count[line] = h
+            self.score += value[r][h]
+        for neighbour in self.neighbours[cell]:
+            self.near[neighbour] -= 1
+
+
+    def winner(self):
+        '''
+        return ... +1 if robot completed a line, -1 for human, 0 otherwise
+        '''
+        if self.robot_lines:
+            return +1
+        elif self.human_lines:
+            return -1
+        return 0
+
+
+    def candidates(self):
+        '''
+        Empty cells worth searching: on boards larger than 4x4 only cells next to a token
+        '''
+        cells = self.cells
+        if self.size > 4:
+            if self.empty == len(cells):
+                # Empty large board, start in the middle
+                return [(self.size // 2) * self.size + self.size // 2]
+            near = self.near
+            return [cell for cell in range(len(cells)) if cells[cell] == 0 and near[cell]]
+        return [cell for cell in range(len(cells)) if cells[cell] == 0]
+
+
+    def priority(self, cell, player):
+        '''
+        Cheap move ordering score: windows the move extends for the player plus windows it blocks
+        '''
+        weights = self.weights
+        total = 0
+        for line in self.cell_lines[cell]:
+            r = self.robot_count[line]
+            h = self.human_count[line]
+            if player == +1:
+                own, other = r, h
+            else:
+                own, other = h, r
+            if other == 0:
+                total += weights[own + 1]
+            if own == 0:
+                total += weights[other + 1]
+        return total
+
+
+class SearchTimeout(Exception):
+    '''
+    Raised inside the search when the time budget has been used up.
+    '''
+    pass
+
+
+class KInARowEngine:
+    '''
+    Iterative deepening alpha-beta search with a hard per-move time budget.
+    Scores are from the robot's point of view, a win is worth WIN plus the remaining depth.
+    '''
+
+    WIN = 10 ** 9
+
+    def __init__(self, size, k, time_budget_ms = None, max_branching = None, workers = 1):
+        self.size = size
+        self.k = k
+        self.time_budget_ms = time_budget_ms
+        self.max_branching = max_branching
+        self.workers = workers
+        self.pool = None
+        self.deadline = None
+        self.stop = None
+        self.partial = None
+        self.nodes = 0
+        self.completed_depth = 0
+
+
+    def best_move(self, board, player = +1, max_depth = None, stop = None):
+        '''
+        Search the best move within the time budget
+        - board ... LineBoard with the current position, it is left unchanged
+        - player ... whose turn it is, +1 for robot's turn, -1 for oponent
+        - max_depth ... optional depth limit, the number of empty cells otherwise
+        - stop ... optional threading.Event, the search ends as if the budget ran out once it is set
+        returns ... (best score, best cell index or -1)
+        '''
+        self.stop = stop
+        if self.time_budget_ms:
+            self.deadline = time.time() + self.time_budget_ms / 1000.0
+        else:
+            self.deadline = None
+        self.completed_depth = 0
+
+        board = board.copy()
+        if board.winner() or board.empty == 0:
+            return self.evaluate(board, 0), -1
+
+        moves = self.order_moves(board, player, -1)
+        best_score, best_cell = board.score, moves[0]
+
+        limit = board.empty if max_depth is None else min(max_depth, board.empty)
+        depth = 1
+        while depth <= limit:
+            self.partial = None
+            try:
+                if self.workers > 1:
+                    best_score, best_cell = self.search_root_parallel(board, depth, player, best_cell)
+                else:
+                    best_score, best_cell = self.search_root(board, depth, player, best_cell)
+            except SearchTimeout:
+                # The previous best move was searched first, anything completed since is at least as good
+                if self.partial is not None:
+                    best_score, best_cell = self.partial
+                break
+
+            self.completed_depth = depth
+            if abs(best_score) >= self.WIN:
+                break
+            depth += 1
+
+        return best_score, best_cell
+
+
+    def evaluate(self, board, depth):
+        winner = board.winner()
+        if winner:
+            return winner * (self.WIN + depth)
+        return board.score
+
+
+    def order_moves(self, board, player, first):
+        moves = board.candidates()
+        moves.sort(key = lambda cell: (cell != first, -board.priority(cell, player)))
+        if self.max_branching and len(moves) > self.max_branching:
+            moves = moves[:self.max_branching]
+        return moves
+
+
+    def check_time(self):
+        if (self.deadline is not None and time.time() > self.deadline) or (self.stop is not None and self.stop.is_set()):
+            raise SearchTimeout()
+
+
+    def search_root(self, board, depth, player, first):
+        alpha, beta = -2 * self.WIN, 2 * self.WIN
+        best_cell = -1
+        for cell in self.order_moves(board, player, first):
+            board.place(cell, player)
+            score = self.alphabeta(board, depth - 1, -player, alpha, beta)
+            board.remove(cell)
+
+            if best_cell < 0 or (player == +1 and score > alpha) or (player == -1 and score < beta):
+                best_cell = cell
+                if player == +1:
+                    alpha = score
+                else:
+                    beta = score
+                self.partial = (score, cell)
+
+        return (alpha if player == +1 else beta), best_cell
+
+
+    def search_root_parallel(self, board, depth, player, first):
+        '''
+        Root split over the process pool, scores are compared from the root player's point of view
+        '''
+        moves = self.order_moves(board, player, first)
+
+        # The eldest brother is searched first to establish the bound for the others
+        board.place(moves[0], player)
+        best_score = self.alphabeta(board, depth - 1, -player, -2 * self.WIN, 2 * self.WIN)
+        board.remove(moves[0])
+        best_cell = moves[0]
+        self.partial = (best_score, best_cell)
+        if len(moves) == 1:
+            return best_score, best_cell
+
+        pool = self.get_pool()
+        self.shared_bound.value = player * best_score
+        self.shared_stop.value = 0
+
+        tasks = [(self.size, self.k, board.cells, cell, depth, player, self.deadline, self.max_branching) for cell in moves[1:]]
+        result = pool.map_async(_search_subtree, tasks, 1)
+        while not result.ready():
+            result.wait(0.01)
+            if (self.deadline is not None and time.time() > self.deadline) or (self.stop is not None and self.stop.is_set()):
+                self.shared_stop.value = 1
+
+        # Results come back in move order, so equal scores keep the ordering preference
+        timed_out = False
+        for cell, score, exact, nodes in result.get():
+            self.nodes += nodes
+            if score is None:
+                timed_out = True
+            elif exact and player * score > player * best_score:
+                best_score, best_cell = score, cell
+                self.partial = (best_score, best_cell)
+
+        if timed_out:
+            raise SearchTimeout()
+        return best_score, best_cell
+
+
+    def get_pool(self):
+        if self.pool is None:
+            self.shared_bound = multiprocessing.Value('d', 0.0)
+            self.shared_stop = multiprocessing.Value('b', 0)
+            self.pool = multiprocessing.Pool(self.workers, _init_worker, (self.shared_bound, self.shared_stop))
+        return self.pool
+
+
+    def close(self):
+        '''
+        Shut down the worker processes
+        '''
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+    def alphabeta(self, board, depth, player, alpha, beta):
+        self.nodes += 1
+        if self.nodes & 63 == 0:
+            self.check_time()
+
+        if board.robot_lines or board.human_lines or depth == 0 or board.empty == 0:
+            if board.empty == 0 and not (board.robot_lines or board.human_lines):
+                return 0
+            return self.evaluate(board, depth)
+
+        if player == +1:
+            best = -2 * self.WIN
+            for cell in self.order_moves(board, player, -1):
+                board.place(cell, player)
+                score = self.alphabeta(board, depth - 1, -1, alpha, beta)
+                board.remove(cell)
+                if score > best:
+                    best = score
+                    if best > alpha:
+                        alpha = best
+                        if alpha >= beta:
+                            break
+        else:
+            best = 2 * self.WIN
+            for cell in self.order_moves(board, player, -1):
+                board.place(cell, player)
+                score = self.alphabeta(board, depth - 1, +1, alpha, beta)
+                board.remove(cell)
+                if score < best:
+                    best = score
+                    if best < beta:
+                        beta = best
+                        if alpha >= beta:
+                            break
+
+        return best
+
+
+## -------------------------------------------------------------
+#    PROCESS POOL WORKERS
+## -------------------------------------------------------------
+
+# Shared between all workers of the pool, set by _init_worker
+_worker_bound = None
+_worker_stop = None
+_worker_boards = {}
+
+
+def _init_worker(bound, stop):
+    global _worker_bound, _worker_stop
+    _worker_bound = bound
+    _worker_stop = stop
+
+
+class _SharedFlag:
+    '''
+    Event-like view of the shared stop value, so the engine can check it like a threading.Event
+    '''
+
+    def __init__(self, value):
+        self.value = value
+
+    def is_set(self):
+        return bool(self.value.value)
+
+
+class _SubtreeEngine(KInARowEngine):
+    '''
+    Engine of a pool task, it keeps narrowing its window to the bound shared by all the workers
+    - player ... the root player, the bound is a score from their point of view
+    '''
+
+    def __init__(self, size, k, max_branching, deadline, player):
+        KInARowEngine.__init__(self, size, k, None, max_branching)
+        self.deadline = deadline
+        self.stop = _SharedFlag(_worker_stop)
+        self.player = player
+        self.bound = _worker_bound.value
+
+
+    def check_time(self):
+        KInARowEngine.check_time(self)
+        self.bound = _worker_bound.value
+
+
+    def alphabeta(self, board, depth, player, alpha, beta):
+        # A better move found by another worker meanwhile cuts the subtrees that can't beat it any more
+        if self.player == +1:
+            alpha = max(alpha, self.bound)
+        else:
+            beta = min(beta, -self.bound)
+        if alpha >= beta:
+            return alpha if self.player == +1 else beta
+        return KInARowEngine.alphabeta(self, board, depth, player, alpha, beta)
+
+
+def _search_subtree(task):
+    '''
+    Pool task searching a single root move
+    - task ... (size, k, cells, cell, depth, player, deadline, max_branching)
+    return ... (cell, score or None when the search was stopped, True if the score is exact, nodes searched)
+    '''
+    size, k, cells, cell, depth, player, deadline, max_branching = task
+
+    # Line tables are built once per process and copied for every task
+    template = _worker_boards.get((size, k))
+    if template is None:
+        template = _worker_boards[(size, k)] = LineBoard(size, k)
+    board = template.copy()
+    for index, value in enumerate(cells):
+        if value != 0:
+            board.place(index, value)
+    board.place(cell, player)
+
+    # Only a move better than the best one found so far by any worker needs an exact score,
+    # the engine re-reads the shared bound every few nodes
+    engine = _SubtreeEngine(size, k, max_branching, deadline, player)
+    try:
+        score = engine.alphabeta(board, depth - 1, -player, -2 * engine.WIN, 2 * engine.WIN)
+    except SearchTimeout:
+        return cell, None, False, engine.nodes
+
+    # The bound only grows, a score above the last one read was searched with a window that held it
+    exact = player * score > engine.bound
+    if exact:
+        with _worker_bound.get_lock():
+            if player * score > _worker_bound.value:
+                _worker_bound.value = player * score
+
+    return cell, score, exact, engine.nodes
@@ -0,0 +1,73 @@
+'''
+Immutable snapshots of the game state for the API.
+
+NaoControl publishes a new snapshot on every state transition. The snapshot is
+serialized to JSON right away and swapped in as a whole, together with its ETag,
+so /api/get_state answers from ready-made bytes: no robot proxies are touched, no
+locks of the control loop are taken and a client that already has the latest
+snapshot gets a bodiless 304 Not Modified.
+'''
+
+import json
+import threading
+import time
+from collections import namedtuple
+
+GameSnapshot = namedtuple('GameSnapshot', ['version', 'time', 'board', 'my_turn', 'next_placement', 'result',
+                                           'confidence', 'timings', 'frame'])
+
+
+def freeze(value):
+    '''
+    Read-only copy of the state values: lists become tuples, NumPy values plain Python ones
+    '''
+    if hasattr(value, 'tolist'):
+        value = value.tolist()
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, dict):
+        return dict((key, freeze(item)) for key, item in value.items())
+    return value
+
+
+class SnapshotPublisher:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = 0
+
+        # ETags of a restarted process must not match the ones its predecessor handed out
+        self.epoch = '{:x}'.format(int(time.time() * 1000))
+        self.current = self.serialize(GameSnapshot(0, time.time(), None, False, None, None, None, {}, None))
+
+
+    def publish(self, board, my_turn, next_placement, result, confidence = None, timings = None, frame = None):
+        '''
+        Take a snapshot of the game state and make it the one served
+        - board ... 3x3 board, 0 empty, +1 / -1 the tokens
+        - my_turn ... True while the robot is placing its token
+        - next_placement ... [row, col, result] of the robot's last decision, -1 before the first one
+        - result ... game result, 1 robot wins, -1 human wins, 0 tie, None while the game isn't over
+        - confidence ... per-field confidence of the last board read, between 0 and 1
+        - timings ... duration of the vision stages in ms
+        - frame ... sequence number of the camera frame the board was read from
+        returns ... the new GameSnapshot
+        '''
+        with self.lock:
+            self.version += 1
+            snapshot = GameSnapshot(self.version, time.time(), freeze(board), bool(my_turn), freeze(next_placement),
+                                    freeze(result), freeze(confidence), freeze(timings or {}), freeze(frame))
+            self.current = self.serialize(snapshot)
+        return snapshot
+
+
+    def serialize(self, snapshot):
+        body = json.dumps(snapshot._asdict(), sort_keys = True)
+        return snapshot, body, '{}-{}'.format(self.epoch, snapshot.version)
+
+
+    def latest(self):
+        '''
+        returns ... (GameSnapshot, JSON body, ETag) of the latest snapshot, a single read of the swapped tuple
+        '''
+        return self.current
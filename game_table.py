@@ -0,0 +1,260 @@
+'''
+Precomputed perfect-play table for every reachable tic-tac-toe position.
+
+The table is a flat binary file: a 4 byte magic header followed by one byte per
+position index (base-3 encoding of the board, 3^9 entries). Each byte holds the
+robot's best move in the low nibble (0-8, 0xF when the game is already over) and
+the game outcome under perfect play in the high nibble. Unreachable positions are
+stored as 0xFF. The file is memory-mapped, so a lookup is a single byte read.
+
+evaluate_batch() scores whole arrays of positions at once with NumPy, using the
+table for the moves and vectorized win detection for positions the table doesn't know.
+
+Usage:
+> python game_table.py generate     ... solve the game tree and write the table
+> python game_table.py verify       ... re-derive the table and diff it against the file
+'''
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+from config import xo_config_play_table
+from game_engine import BitboardEngine, TranspositionTable, FULL_MASK, WIN_MASKS, reachable_positions, decode, count_bits
+
+MAGIC = b'XOT1'
+TABLE_SIZE = 3 ** 9
+UNKNOWN = 0xFF
+NO_MOVE = 0x0F
+
+# Outcome codes stored in the high nibble
+OUTCOME_TIE = 0
+OUTCOME_ROBOT = 1
+OUTCOME_HUMAN = 2
+
+# Outcome code -> result from the robot's point of view (+1 robot wins, -1 human wins, 0 tie)
+OUTCOME_RESULT = np.array([0, +1, -1], dtype = np.int8)
+
+# Per-cell weights used by the vectorized conversions
+CELL_POWERS = 3 ** np.arange(9, dtype = np.int64)
+CELL_BITS = 1 << np.arange(9, dtype = np.int64)
+WIN_MASK_ARRAY = np.array(WIN_MASKS, dtype = np.int64)
+
+# Base-3 weight of every 9-bit mask, index = TERNARY[robot_bits] + 2 * TERNARY[human_bits]
+TERNARY = tuple(sum(3 ** cell for cell in range(9) if bits >> cell & 1) for bits in range(FULL_MASK + 1))
+
+
+def position_index(robot_bits, human_bits):
+    '''
+    Base-3 index of a position, robot cells count as 1 and human cells as 2
+    '''
+    return TERNARY[robot_bits] + 2 * TERNARY[human_bits]
+
+
+def outcome_code(score, max_score = 10, min_score = -10):
+    if score == max_score:
+        return OUTCOME_ROBOT
+    elif score == min_score:
+        return OUTCOME_HUMAN
+    return OUTCOME_TIE
+
+
+def outcome_score(code, max_score = 10, min_score = -10):
+    if code == OUTCOME_ROBOT:
+        return max_score
+    elif code == OUTCOME_HUMAN:
+        return min_score
+    return 0
+
+
+def build_table(engine = None):
+    '''
+    Solve every reachable position with the robot to move
+    - engine ... search engine to derive the moves with, defaults to a bitboard engine with an unbounded cache
+    return ... bytearray with TABLE_SIZE entries
+    '''
+    if engine is None:
+        engine = BitboardEngine(cache = TranspositionTable())
+    table = bytearray([UNKNOWN]) * TABLE_SIZE
+
+    for robot_bits, human_bits in reachable_positions():
+        status = engine.is_win(robot_bits, human_bits)
+        if status or (robot_bits | human_bits) == FULL_MASK:
+            entry = (outcome_code(status) << 4) | NO_MOVE
+        else:
+            depth = 9 - count_bits(robot_bits | human_bits)
+            score, cell = engine.minimax(robot_bits, human_bits, depth, +1)
+            entry = (outcome_code(score) << 4) | cell
+        table[position_index(robot_bits, human_bits)] = entry
+
+    return table
+
+
+def write_table(path):
+    '''
+    Generate the table and store it atomically on disk
+    '''
+    table = build_table()
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(table)
+    os.rename(tmp_path, path)
+    return table
+
+
+class PlayTable:
+    '''
+    Read-only, memory-mapped view of the perfect-play table.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = None
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+
+        if self.data[:len(MAGIC)] != MAGIC or len(self.data) != len(MAGIC) + TABLE_SIZE:
+            self.close()
+            raise ValueError('File ' + str(path) + ' is not a valid play table')
+
+
+    def entry(self, index):
+        return struct.unpack_from('B', self.data, len(MAGIC) + index)[0]
+
+
+    def lookup(self, robot_bits, human_bits):
+        '''
+        Look up the stored result for a position
+        return ... (best cell index or -1, outcome code) or None for positions not in the table
+        '''
+        entry = self.entry(position_index(robot_bits, human_bits))
+        if entry == UNKNOWN:
+            return None
+
+        cell = entry & 0x0F
+        if cell == NO_MOVE:
+            cell = -1
+        return cell, entry >> 4
+
+
+    def array(self):
+        '''
+        Zero-copy NumPy view of the table entries
+        '''
+        if self.entries is None:
+            self.entries = np.frombuffer(self.data, dtype = np.uint8, count = TABLE_SIZE, offset = len(MAGIC))
+        return self.entries
+
+
+    def close(self):
+        # The NumPy view has to go before the map can be closed
+        self.entries = None
+        self.data.close()
+        self.file.close()
+
+
+def batch_digits(boards):
+    '''
+    Convert a batch of positions to base-3 cell digits (0 empty, 1 robot, 2 human)
+    - boards ... (N, 3, 3) / (N, 9) array with +1 / -1 / 0 values, or (N,) array of position indices
+    return ... (N, 9) int64 array
+    '''
+    boards = np.asarray(boards)
+    if boards.ndim == 1:
+        return (boards.astype(np.int64)[:, None] // CELL_POWERS) % 3
+
+    cells = boards.reshape(len(boards), 9)
+    return (cells == 1).astype(np.int64) + 2 * (cells == -1)
+
+
+def evaluate_batch(entries, boards, engine = None):
+    '''
+    Score many positions at once with the robot to move. The input is never modified.
+    - entries ... table entries as a uint8 array, see PlayTable.array()
+    - boards ... (N, 3, 3) int8 array of boards or (N,) array of position indices
+    - engine ... search engine for the rare non-terminal positions missing from the table
+    return ... (moves, outcomes): best cell index per position (-1 if the game is over) and
+               the result under perfect play (+1 robot wins, -1 human wins, 0 tie)
+    '''
+    digits = batch_digits(boards)
+    indices = digits.dot(CELL_POWERS)
+    found = entries[indices]
+
+    moves = (found & 0x0F).astype(np.int8)
+    moves[moves == NO_MOVE] = -1
+    outcomes = OUTCOME_RESULT[np.minimum(found >> 4, 2)]
+
+    unknown = np.nonzero(found == UNKNOWN)[0]
+    if len(unknown):
+        # Vectorized win detection for positions outside the table
+        robot_bits = (digits[unknown] == 1).dot(CELL_BITS)
+        human_bits = (digits[unknown] == 2).dot(CELL_BITS)
+        robot_wins = ((robot_bits[:, None] & WIN_MASK_ARRAY) == WIN_MASK_ARRAY).any(axis = 1)
+        human_wins = ((human_bits[:, None] & WIN_MASK_ARRAY) == WIN_MASK_ARRAY).any(axis = 1)
+        full = (robot_bits | human_bits) == FULL_MASK
+
+        moves[unknown] = -1
+        outcomes[unknown] = np.where(robot_wins, 1, np.where(human_wins, -1, 0))
+
+        if engine is None:
+            engine = BitboardEngine()
+        for position in np.nonzero(~(robot_wins | human_wins | full))[0]:
+            robot, human = int(robot_bits[position]), int(human_bits[position])
+            score, cell = engine.minimax(robot, human, 9 - count_bits(robot | human), +1)
+            moves[unknown[position]] = cell
+            outcomes[unknown[position]] = (score > 0) - (score < 0)
+
+    return moves, outcomes
+
+
+def verify_table(path):
+    '''
+    Re-derive the table with a plain (uncached) engine and compare it to the file entry by entry
+    return ... list of indices that differ
+    '''
+    table = PlayTable(path)
+    expected = build_table(BitboardEngine())
+    mismatches = [index for index in range(TABLE_SIZE) if table.entry(index) != expected[index]]
+    table.close()
+    return mismatches
+
+
+def board_of_index(index):
+    '''
+    Inverse of position_index, used for reporting
+    '''
+    robot_bits = 0
+    human_bits = 0
+    for cell in range(9):
+        digit = index % 3
+        if digit == 1:
+            robot_bits |= 1 << cell
+        elif digit == 2:
+            human_bits |= 1 << cell
+        index //= 3
+    return decode(robot_bits, human_bits)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Generate or verify the perfect-play table.')
+    parser.add_argument('command', choices = ['generate', 'verify'])
+    parser.add_argument('--table', type = str, default = xo_config_play_table, help = 'Path of the table file')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        table = write_table(args.table)
+        known = sum(1 for entry in table if entry != UNKNOWN)
+        print('Table with ' + str(known) + ' positions written to ' + args.table)
+    else:
+        mismatches = verify_table(args.table)
+        for index in mismatches[:20]:
+            print('Mismatch at index ' + str(index) + ': ' + str(board_of_index(index)))
+        if mismatches:
+            print(str(len(mismatches)) + ' entries differ from the engine')
+            sys.exit(1)
+        print('Table ' + args.table + ' matches the engine')
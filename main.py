@@ -5,34 +5,55 @@ Date: June 18, 2019
 Company: DHL Information Services (Europe), s.r.o.
 
 @author: mkoldus, jslesing
+
+The games run on a background thread and the web server keeps answering the dashboard and
+the API meanwhile. A session manager plays one game after another, games are also started and
+stopped through the API, the robot stays connected and in position between them.
+> python main.py
 '''
 import sys, os, signal
 import argparse
-from threading import Timer
+import threading
 import logging
-from flask import Flask, send_from_directory, request
-import json
+from flask import Flask, send_from_directory, request, Response, jsonify
 from config import *
 from nao_control import NaoControl as NaoControlModule
+import frame_stream
+from event_stream import EventLog, EventHandler
+from session_manager import SessionManager
 
 # Default parameter
 robotIp = "marvin.local"
 port = 9559
+webPort = 5000
 NaoControl = None
+session = None
+events = EventLog()
+
+# The thread running the current game, started and stopped through the API
+game_thread = None
+game_lock = threading.RLock()
 
 
 def sigint_handler(signum, frame):
     shutdown_robot()
+    sys.exit()
 
 def shutdown_robot():
     print("Shutting down. Good night.")
     if NaoControl != None:
+        stop_game(5.0)
         NaoControl.relax_arms()
+        if NaoControl.capture is not None:
+            NaoControl.capture.close()
         NaoControl.cameraProxy.unsubscribe(NaoControl.video_client)
+        NaoControl.vision.dashboard.close()
+    events.close()
 
 def initialize_robot():
-    global NaoControl
-    NaoControl = NaoControlModule("NaoControl", logging)
+    global NaoControl, session
+    NaoControl = NaoControlModule("NaoControl", logging, events)
+    session = SessionManager(NaoControl, logging)
 
     if(not NaoControl.state.init_completed):
         logging.warning("%s initialization process couldn't be completed and the game ended.", str(xo_config_robot_name))
@@ -40,33 +61,64 @@ def initialize_robot():
         sys.exit()
 
 ## -------------------------------------------------------------
- #    START THE MAIN PROCESS
+ #    GAME THREAD
 ## -------------------------------------------------------------
-#if __name__ == '__main__':
-    
-signal.signal(signal.SIGINT, sigint_handler)
-
-# Setup the main logger
-logging.basicConfig(filename = 'static/data/main.log', filemode = 'w', format = '%(asctime)s;%(levelname)s;%(filename)s;%(message)s', level = logging.DEBUG)
-
-# Connect and wake up the robot
-try:
-    logging.info("Connecting to robot at %s:%d", str(robotIp), int(port))
-    
-    from naoqi import ALBroker
-    myBroker = ALBroker("myBroker",
-        "0.0.0.0",        # listen to anyone
-        0,                # find a free port and use it
-        str(robotIp),     # parent broker IP
-        int(port))        # parent broker port
-    initialize_robot()
-    NaoControl.begin_game()  # TODO start from API
-except Exception as e:
-    logging.error('Error message: %s', str(e).replace("\n"," ").replace("\t"," "))
-    shutdown_robot()
-    sys.exit()
+def run_game():
+    try:
+        session.run()
+    except Exception as e:
+        logging.error('Error message: %s', str(e).replace("\n"," ").replace("\t"," "))
+
+def game_running():
+    return game_thread != None and game_thread.is_alive()
+
+def start_game():
+    '''
+    Start a new game on the game thread unless one is running already, the session
+    continues with the next games by itself
+    returns ... True if a game was started
+    '''
+    global game_thread
+    with game_lock:
+        if NaoControl == None or game_running():
+            return False
+        NaoControl.stop_requested.clear()
+        game_thread = threading.Thread(target = run_game, name = "game")
+        game_thread.daemon = True
+        game_thread.start()
+        return True
+
+def stop_game(timeout = 30.0):
+    '''
+    Stop the running game, the robot finishes its current motion or sentence first
+    returns ... True if no game is running any more
+    '''
+    with game_lock:
+        if game_running():
+            NaoControl.stop_game()
+            game_thread.join(timeout)
+        return not game_running()
+
+def new_game():
+    '''
+    Stop the running game, if any, and start the next one
+    '''
+    with game_lock:
+        return stop_game() and start_game()
+
+## -------------------------------------------------------------
+ #    LOGGING AND WEBSERVER
+## -------------------------------------------------------------
+
+# Setup the main logger, the records go to the log file and to the dashboard's event stream
+log_format = '%(asctime)s;%(levelname)s;%(filename)s;%(message)s'
+if not os.path.exists('static/data'):
+    os.makedirs('static/data')
+logging.basicConfig(filename = 'static/data/main.log', filemode = 'w', format = log_format, level = logging.DEBUG)
+event_handler = EventHandler(events)
+event_handler.setFormatter(logging.Formatter(log_format))
+logging.getLogger().addHandler(event_handler)
 
-# Start webserver
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 app = Flask(__name__)
@@ -83,9 +135,64 @@ def static_resources(filename):
     return send_from_directory('static', filename)
 
 @app.route('/api/get_state')
-def api_get_status():
+def api_get_state():
+    '''
+    Latest snapshot of the game state, pre-serialized by NaoControl. A client sending the ETag
+    of the snapshot it has in If-None-Match gets 304 Not Modified until the state changes.
+    '''
     global NaoControl
-    return flask.Response(json.dumps(NaoControl), mimetype='application/json')
+    if NaoControl == None:
+        return 'Not connected', 506
+    snapshot, body, etag = NaoControl.snapshots.latest()
+    response = Response(body, mimetype = 'application/json', headers = {'Cache-Control': 'no-cache'})
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+@app.route('/api/events')
+def api_events():
+    '''
+    Server-Sent Events of the log records ("log") and the game state changes ("state"),
+    a reconnecting client resumes after the id in the Last-Event-ID header or ?last_id=
+    '''
+    last_id = request.headers.get('Last-Event-ID', type = int) or request.args.get('last_id', 0, type = int)
+    return Response(events.messages(last_id), mimetype = 'text/event-stream', headers = {'Cache-Control': 'no-cache'})
+
+def game_response(accepted):
+    return jsonify(accepted = accepted, running = game_running())
+
+@app.route('/api/game/start', methods = ['POST'])
+def api_game_start():
+    if NaoControl == None:
+        return 'Not connected', 506
+    return game_response(start_game())
+
+@app.route('/api/game/stop', methods = ['POST'])
+def api_game_stop():
+    if NaoControl == None:
+        return 'Not connected', 506
+    return game_response(stop_game())
+
+@app.route('/api/game/new', methods = ['POST'])
+def api_game_new():
+    if NaoControl == None:
+        return 'Not connected', 506
+    return game_response(new_game())
+
+@app.route('/api/session')
+def api_session():
+    '''
+    Statistics of the session: results, average game and setup time in seconds and games/hour
+    '''
+    if session == None:
+        return 'Not connected', 506
+    return jsonify(session.stats())
+
+@app.route('/api/session/new', methods = ['POST'])
+def api_session_new():
+    if session == None:
+        return 'Not connected', 506
+    session.new_session()
+    return jsonify(session.stats())
 
 @app.route('/api/say')
 def api_say():
@@ -99,35 +206,69 @@ def api_say():
     except Exception as e:
         print(e)
 
+# Live dashboard images, each route streams the newest encoding of one dashboard image
+IMAGE_STREAMS = {
+    'camera': 'raw_image.jpg',
+    'blob': 'lines.jpg',
+    'rectified': 'current_state_raw.jpg',
+    'boardstate': 'game_state.jpg'
+}
+
+def image_stream(kind):
+    '''
+    MJPEG stream of a dashboard image, an optional ?fps= lowers the frame rate for slow clients
+    '''
+    global NaoControl
+    if NaoControl == None:
+        return 'Not connected', 506
+    stream = NaoControl.vision.dashboard.stream
+    if stream == None:
+        return 'Dashboard images are disabled', 404
+    frames = stream.frames_of(IMAGE_STREAMS[kind], request.args.get('fps', type = float))
+    return Response(frames, mimetype = 'multipart/x-mixed-replace; boundary=' + frame_stream.BOUNDARY)
+
 @app.route('/api/get_img_camera')
 def api_get_img_camera():
-    try:
-        return flask.Response('', mimetype='image/jpeg')
-    except Exception as e:
-        print(e)
-        return 'chyba', 599
+    return image_stream('camera')
 
 @app.route('/api/get_img_blob')
 def api_get_img_blob():
-    try:
-        return flask.Response('', mimetype='image/jpeg')
-    except Exception as e:
-        print(e)
-        return 'chyba', 599
+    return image_stream('blob')
 
 @app.route('/api/get_img_rectified')
 def api_get_img_rectified():
-    try:
-        return flask.Response('', mimetype='image/jpeg')
-    except Exception as e:
-        print(e)
-        return 'chyba', 599
+    return image_stream('rectified')
 
 @app.route('/api/get_img_boardstate')
 def api_get_img_boardstate():
+    return image_stream('boardstate')
+
+
+## -------------------------------------------------------------
+ #    START THE MAIN PROCESS
+## -------------------------------------------------------------
+if __name__ == '__main__':
+
+    signal.signal(signal.SIGINT, sigint_handler)
+
+    # Connect and wake up the robot
     try:
-        return flask.Response('', mimetype='image/jpeg')
+        logging.info("Connecting to robot at %s:%d", str(robotIp), int(port))
+
+        from naoqi import ALBroker
+        myBroker = ALBroker("myBroker",
+            "0.0.0.0",        # listen to anyone
+            0,                # find a free port and use it
+            str(robotIp),     # parent broker IP
+            int(port))        # parent broker port
+        initialize_robot()
     except Exception as e:
-        print(e)
-        return 'chyba', 599
+        logging.error('Error message: %s', str(e).replace("\n"," ").replace("\t"," "))
+        shutdown_robot()
+        sys.exit()
+
+    # The first game starts right away, the session continues with the next ones
+    start_game()
 
+    # Start webserver, every request on its own thread so the streams don't block each other
+    app.run(host = '0.0.0.0', port = webPort, threaded = True, use_reloader = False)
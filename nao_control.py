@@ -3,6 +3,7 @@ import cv2
 import random
 import functools
 import time
+import threading
 import motion
 import sys
 from naoqi import ALProxy
@@ -12,7 +13,9 @@ from config import *
 from naoqi import ALModule
 import almath
 from nao_vision import NaoVision
+from camera_capture import CameraCapture, decode_frame
 from game_control import GameControl
+from game_snapshot import SnapshotPublisher
 
 import inspect
 
@@ -23,13 +26,21 @@ class State:
     board_visible = False
     game_ready = False
     board = [[0,0,0], [0,0,0], [0,0,0]]
-    result = -1
+    result = None
     begging_left_arm = False
     begging_right_arm = False
     next_placement = -1
+    my_turn = False
+    confidence = None
     def __init__(self):
         pass
 
+class GameStopped(Exception):
+    '''
+    Raised in the waiting loops of the game once a stop has been requested
+    '''
+    pass
+
 class NaoControl(ALModule):    
     '''
     Main class that controls the game and all interaction with the Nao robot.
@@ -40,9 +51,12 @@ class NaoControl(ALModule):
     #    MAIN FUNCTIONS
     ## -------------------------------------------------------------
 
-    def __init__(self, name, logging):  
+    def __init__(self, name, logging, events = None):  
         self.logger = logging
         self.state = State()
+        self.events = events
+        self.snapshots = SnapshotPublisher()
+        self.stop_requested = threading.Event()
         global NaoControl
         '''
         Constructor for NaoControl class - establishes necessary proxies with Nao robot and instantiates the game and vision objects.
@@ -63,8 +77,15 @@ class NaoControl(ALModule):
 
         self.logger.debug("Proxies with %s established", str(xo_config_robot_name))
 
-        # Configure camera
+        # Configure camera and keep the frames coming in the background
         self.configure_camera()
+        self.capture = None
+        self.vision = None
+        self.last_frame_time = 0
+        self.frame_sequence = -1
+        if xo_config_capture_thread:
+            self.capture = CameraCapture(logging, functools.partial(self.grab_frame, with_stamp = True))
+            self.capture.start()
         im = self.take_a_look()
         
         # Initiate the CV module and game
@@ -94,6 +115,7 @@ class NaoControl(ALModule):
             self.logger.debug("Compare board [{},{}] old:{} seen:{}".format(row, col, self.state.board[row][col], board_seen[row][col]))
             self.vision.renderImage(board_seen)
             self.state.board = board_seen
+            self.publish_state()
             return True
         else:
             return False
@@ -101,6 +123,7 @@ class NaoControl(ALModule):
 
     def wait_for_my_turn_completion(self):
         while self.state.my_turn:
+            self.check_stop()
             time.sleep(0.1)
 
 
@@ -132,19 +155,51 @@ class NaoControl(ALModule):
         self.tts_say(["That was a fun game. Your moves were optimal.", "Good job. It is a tie. It is not so easy to beat me", "You won. I won. It is a tie."])
 
     def wait_for_opponent_token(self):
-        cycles = random.randrange(4)
+        # Think about the replies while the human is making up their mind
+        self.game.ponder(self.state.board)
+
+        # The full board analysis only runs when a field changed against the last board read
+        # and the scene has been steady for a moment, i.e. the hand is out of the view
+        reference = None
+        previous = None
+        last_motion = None
+        last_read = 0
+        next_chat = time.time() + 0.5 * (10 - random.randrange(4))
         while True:
-            cycles = cycles + 1
-            picture = self.take_a_look()
-            board_seen = self.vision.get_current_state(picture)
-            self.logger.debug("board_seen {}".format(board_seen))
-            if self.is_board_changed(board_seen):
-                self.state.my_turn = True
-                return board_seen
-            else:
-                time.sleep(0.5)
-            if cycles == 10:
-                cycles = 0
+            self.check_stop()
+            picture = self.take_a_look(self.last_frame_time)
+
+            # Follow the board if it gets bumped, search for it again once it's lost
+            if not self.vision.track_board(picture, self.last_frame_time):
+                self.relocate_board()
+                reference = None
+                previous = None
+                continue
+            thumbnail = self.vision.board_thumbnail(picture)
+
+            # Steadiness is measured in time since the last frame that differed from its predecessor
+            if previous is None or (self.vision.cell_difference(thumbnail, previous) > xo_config_settle_threshold).any():
+                last_motion = self.last_frame_time
+            steady = self.last_frame_time - last_motion
+            previous = thumbnail
+
+            changed = reference is None or (self.vision.cell_difference(thumbnail, reference) > xo_config_motion_threshold).any()
+            recheck = time.time() - last_read >= xo_config_recheck_interval
+            if (changed and (reference is None or steady >= xo_config_settle_seconds)) or (recheck and steady > 0):
+                board_seen, confidence = self.vision.get_current_state(picture, with_confidence = True)
+                self.state.confidence = confidence
+                self.logger.debug("board_seen {} confidence {}".format(board_seen, confidence))
+                if self.is_board_changed(board_seen):
+                    self.state.my_turn = True
+                    self.publish_state()
+                    return board_seen
+
+                # Nothing was played, the change was light or a hand, compare against this frame from now on
+                reference = thumbnail
+                last_read = time.time()
+
+            if time.time() >= next_chat:
+                next_chat = time.time() + 5.0
                 self.tts_say(["Can you speed up?", 
                     "I am a bit bored.", 
                     "Do you know who is the current president?", 
@@ -174,36 +229,105 @@ class NaoControl(ALModule):
 
 
     def begin_game(self):
+        '''
+        Play one game, returns once it's finished or a stop was requested with stop_game
+        '''
         self.logger.debug("Game begins")
         self.state.game_ready = True
+        self.publish_state()
+        try:
+            self.play_game()
+        except GameStopped:
+            self.logger.info("The game was stopped.")
+            self.abort_move()
+        finally:
+            self.game.stop_pondering()
+            self.state.game_ready = False
+
+
+    def play_game(self):
         self.tts_say(["Lets start the game. \\vct=150\\You play first. \\vct=100\\Color of your tokens is \\pau=400\\ blue.", "Please start. It is your turn now. Your tokens are \\pau=400\\blue."])
 
         while True:
             board_seen = self.wait_for_opponent_token() #image
             self.tts_say(["Nice play", "I see", "Are you sure?", "Aha", "Fine", "OK ok", "Really?", "I thought you will play like this.", "That's good"])
             self.state.next_placement = self.game.play(board_seen)  # [row, col, state]  state 0:tie, 1:robotwins, -1:humanwins, None: continue
+            self.publish_state()
 
             if (self.state.next_placement[0] != None and self.state.next_placement[1] != None):
                 # marvin makes a move
                 self.game.render(self.state.board)
                 self.beg_for_token_start(self.arm_responsible(self.state.next_placement))
                 self.wait_for_my_turn_completion()
-                self.vision.renderImage(self.vision.get_current_state(self.take_a_look()))
+                self.vision.renderImage(self.vision.get_current_state(self.take_a_look(time.time())))
 
             if self.is_game_finished(self.state.next_placement[2]):
-                self.vision.renderImage(self.vision.get_current_state(self.take_a_look()))
+                self.vision.renderImage(self.vision.get_current_state(self.take_a_look(time.time())))
                 self.state.result = self.state.next_placement[2]
+                self.publish_state()
                 break
 
             self.tts_say(["Your turn my dear", "Please go", "Your turn", "Please, play"])
-        
 
 
-    
+    def stop_game(self):
+        '''
+        Ask the running game to stop, begin_game returns at the next check of the waiting loops
+        '''
+        self.stop_requested.set()
+
+
+    def check_stop(self):
+        if self.stop_requested.is_set():
+            raise GameStopped()
+
+
+    def abort_move(self):
+        '''
+        Leave a robot's move that was interrupted: stop waiting for the token and put the arms down
+        '''
+        if self.state.begging_left_arm or self.state.begging_right_arm:
+            try:
+                memory.unsubscribeToEvent("TouchChanged", "NaoControl")
+            except Exception as e:
+                self.logger.debug("Touch event not unsubscribed: %s", str(e))
+            self.state.begging_left_arm = False
+            self.state.begging_right_arm = False
+            self.relax_arms()
+        self.state.my_turn = False
+
+
+    def reset_game(self):
+        '''
+        Forget the last game: empty board, no result and no pending move. The robot's posture,
+        the camera and the board position are kept for the next game.
+        '''
+        self.state.board = [[0,0,0], [0,0,0], [0,0,0]]
+        self.state.result = None
+        self.state.next_placement = -1
+        self.state.my_turn = False
+        self.state.begging_left_arm = False
+        self.state.begging_right_arm = False
+        self.state.confidence = None
+        self.publish_state()
+
+
+
     ## -------------------------------------------------------------
     #    SUPPORTING FUNCTIONS
     ## -------------------------------------------------------------
 
+    def publish_state(self):
+        '''
+        Publish a snapshot of the game state for the API and push it to the dashboard's event stream,
+        called on every state transition
+        '''
+        snapshot = self.snapshots.publish(self.state.board, self.state.my_turn, self.state.next_placement, self.state.result,
+                                          self.state.confidence, self.vision.timings, self.frame_sequence)
+        if self.events is not None:
+            self.events.publish("state", snapshot._asdict())
+
+
     def assume_initial_position(self):
         '''
         Function that disables the autonomous life and lunches the sequence to assume the initial position.
@@ -274,6 +398,22 @@ class NaoControl(ALModule):
         # Close the initialization process
         self.logger.debug("Initial position assumed, default position set to " + xo_config_base_position + " for efficient stability")
 
+    def relocate_board(self):
+        '''
+        The board was moved too much to be followed, find it again and fix its new position.
+        '''
+        self.logger.warning("Board tracking lost, searching for the board again.")
+        self.tts_say(["Where is the board?", "Hey, who moved the board?", "I lost the board. Let me find it again."])
+
+        while True:
+            self.check_stop()
+            found, img, blob_size = self.vision.find_board(self.take_a_look(self.last_frame_time))
+            if found:
+                self.vision.fix_board_position(img)
+                break
+
+        self.logger.info("Game board found again at a new position.")
+
     def relax_arms(self):
         rNames = ["RShoulderPitch", "RShoulderRoll", "RElbowYaw", "RElbowRoll", "RWristYaw", "RHand",
             "LShoulderPitch", "LShoulderRoll", "LElbowYaw", "LElbowRoll", "LWristYaw", "LHand"]
@@ -376,6 +516,7 @@ class NaoControl(ALModule):
             # Relax and close hand        
             self.relax_arm(effector_side)
         self.state.my_turn = False
+        self.publish_state()
 
 
     def configure_camera(self):
@@ -385,7 +526,7 @@ class NaoControl(ALModule):
         
         # Setup camera proxy to be used for image retrievals for later processing
         self.cameraProxy.setActiveCamera(xo_config_camera_id)
-        self.video_client = self.cameraProxy.subscribeCamera("python_client", xo_config_camera_id, 2, 11, 5)
+        self.video_client = self.cameraProxy.subscribeCamera("python_client", xo_config_camera_id, xo_config_camera_resolution, xo_config_camera_color_space, xo_config_camera_fps)
 
         self.logger.debug("Connection with camera established + video_client subscription configured.")
         
@@ -401,17 +542,44 @@ class NaoControl(ALModule):
         self.logger.debug("Camera Matrix for SolvePnP established: %s", str(self.cameraMatrix.tolist()))
 
     
-    def take_a_look(self):
+    def take_a_look(self, newer_than = None):
         '''
         take_a_look is used to take a snapshot from the camera view and format for later processing.
+        - newer_than ... optional time.time() value, the frame returned is captured after it
         '''
-        nao_image = self.cameraProxy.getImageRemote(self.video_client)
-        
-        frame = np.asarray(bytearray(nao_image[6]), dtype=np.uint8)
-        frame = frame.reshape((nao_image[1],nao_image[0],3))
-        frame = frame[...,::-1]
-
+        if self.capture is not None:
+            latest = self.capture.latest(newer_than, xo_config_capture_timeout)
+            if latest is not None:
+                frame, self.last_frame_time, self.frame_sequence = latest
+                self.logger.debug("Camera frame %d taken from the capture buffer.", self.frame_sequence)
+                return self.show_frame(frame)
+            self.logger.warning("No fresh frame from the capture thread, reading the camera directly.")
+
+        frame = self.grab_frame()
+        self.last_frame_time = time.time()
+        self.frame_sequence += 1
         self.logger.debug("A camera snapshot was taken.")
+        return self.show_frame(frame)
+
+
+    def show_frame(self, frame):
+        '''
+        Pass the frame on to the live camera stream of the dashboard, only while somebody watches it
+        '''
+        if self.vision is not None and self.vision.dashboard.watched("raw_image.jpg"):
+            self.vision.dashboard.submit("raw_image.jpg", frame)
+        return frame
+
+
+    def grab_frame(self, with_stamp = False):
+        '''
+        Read a frame from the camera, waits for the full network round-trip
+        - with_stamp ... also return the camera timestamp of the frame, (seconds, microseconds)
+        '''
+        nao_image = self.cameraProxy.getImageRemote(self.video_client)
+        frame = decode_frame(nao_image, xo_config_camera_color_space)
+        if with_stamp:
+            return frame, (nao_image[4], nao_image[5])
         return frame
 
 
@@ -2,6 +2,13 @@ import cv2 as cv
 import numpy as np
 import time
 import os
+from dashboard_writer import DashboardWriter
+import board_geometry
+import color_table
+from config import xo_config_motion_tile, xo_config_signature_threshold
+from config import xo_config_detection_scale, xo_config_detection_coarse_ratio
+from config import xo_config_tracking_drift, xo_config_tracking_min_points, xo_config_tracking_lost_seconds
+from config import xo_config_line_merge_distance, xo_config_line_merge_angle
 
 '''
 Open tasks:
@@ -13,8 +20,13 @@ Embedded simplifications:
 
 class NaoVision:    
 
-    def __init__(self, sizes, logging):
+    def __init__(self, sizes, logging, dashboard = None):
         self.logger = logging
+        self.dashboard = dashboard if dashboard is not None else DashboardWriter(logging)
+        self.color_threshold = 20
+        self.ignore_margin_pt = 10
+        self.color_table = color_table.load_table(logging = logging)
+        self.timings = {}
         self.logger.debug("Computer vision initialized with the following camera size: %s",str(sizes))
 
 
@@ -22,27 +34,54 @@ class NaoVision:
     def find_board(self, img):
         '''
         Function that analyzes camera input and searches for the board.
+        The blob is searched for on a downscaled copy first, the full resolution analysis only covers its bounding box.
+        Duration of the individual stages in ms is stored in self.timings.
         returns ... True / False depending on the result
         '''
-        
-        # Pre-process the image for blob identification
-        im_transformed = self.image_preprocessing(img)
+        self.timings = {}
+        start = time.time()
+
+        # Coarse blob search on the downscaled image
+        scale = xo_config_detection_scale
+        small = cv.resize(img, (img.shape[1] // scale, img.shape[0] // scale), interpolation = cv.INTER_AREA)
+        coarse_blob, coarse_size = self.find_biggest_blob(self.image_preprocessing(small, scale))
+        coarse_size = coarse_size * scale * scale
+        start = self.record_timing('coarse', start)
+
+        if( coarse_size < xo_config_detection_coarse_ratio * 140000 ):
+            self.logger.debug("No board identified. The biggest blog size estimated: %s",str(coarse_size))
+            return False, img, coarse_size
+
+        # Full resolution pre-processing of the blob's bounding box only, with a margin for the filters
+        x, y, w, h = cv.boundingRect(coarse_blob[0])
+        margin = 2 * scale + 16
+        x0, y0 = max(0, x * scale - margin), max(0, y * scale - margin)
+        x1, y1 = min(img.shape[1], (x + w) * scale + margin), min(img.shape[0], (y + h) * scale + margin)
+        im_transformed = self.image_preprocessing(img[y0:y1, x0:x1])
         self.logger.debug("Image has been pre-processed for further analysis.")
+        start = self.record_timing('preprocessing', start)
 
         # Find the biggest blob
         biggest_blob, biggest_blob_size = self.find_biggest_blob(im_transformed)
+        start = self.record_timing('blob', start)
         if( biggest_blob_size >= 140000 ):
             self.logger.debug("A sufficiently large blob has been identified. Image will now be cleaned.")
 
-            # Remove anything outside the biggest blob
-            im_cleaned = self.clean_image(im_transformed, biggest_blob)
+            # Remove anything outside the biggest blob and put the region back into a full frame
+            im_cleaned = np.zeros(img.shape[:2], dtype = np.uint8)
+            im_cleaned[y0:y1, x0:x1] = self.clean_image(im_transformed, biggest_blob)
             self.logger.debug("The image has been cleaned. Next line detection analysis will be performed.")
+            start = self.record_timing('clean', start)
 
             # Determine if the biggest blob is indeed the 3x3 matrix we need
             lines, im_lines = self.find_lines(im_cleaned, 200)
+            start = self.record_timing('lines', start)
 
             # Check if the lines consitute a matrix
-            if self.check_matrix(lines, im_lines):
+            found = self.check_matrix(lines, im_lines)
+            self.record_timing('matrix', start)
+            self.logger.debug("Board detection timings in ms: %s", str(self.timings))
+            if found:
                 self.logger.debug('Game board detected.')
                 return True, im_cleaned, biggest_blob_size
             
@@ -51,6 +90,13 @@ class NaoVision:
         self.logger.debug("No board identified. The biggest blog size found: %s",str(biggest_blob_size))
         return False, img, biggest_blob_size
 
+
+
+    def record_timing(self, stage, start):
+        now = time.time()
+        self.timings[stage] = 1000 * (now - start)
+        return now
+
         
 
     def fix_board_position(self, img):
@@ -86,91 +132,162 @@ class NaoVision:
         # Construct destination points for correct image
         self.matrix_destination = np.array([ [0, 0], [self.matrix_dim, 0], [self.matrix_dim, self.matrix_dim], [0, self.matrix_dim] ], dtype = "float32")
 
-        self.logger.debug("The image coordinates have been fixed. Do not move the board from this point forward.")
+        # The perspective transform and the pixel maps are only computed again when the board moves
+        self.homography = cv.getPerspectiveTransform(self.corners, self.matrix_destination)
+        self.update_maps()
+
+        # The 16 grid intersections followed by track_board, in camera and in rectified board coordinates
+        self.grid_points = board_geometry.rounded(board_geometry.intersections(h_lines_ordered, v_lines_ordered)).reshape(-1, 2).astype("float32")
+        self.grid_board = cv.perspectiveTransform(self.grid_points.reshape(-1, 1, 2), self.homography).reshape(-1, 2)
+        self.track_gray = None
+        self.track_points = None
+        self.track_failures = 0
+        self.track_time = None
+
+        self.logger.debug("The image coordinates have been fixed. The board position is tracked from this point forward.")
         return(im_lines)
 
 
 
-    def get_current_state(self, img):
+    def update_maps(self):
+        '''
+        Derive the pixel maps of the fields from the current homography and forget the cached field labels.
+        '''
+        self.cell_map, self.cell_bounds = self.build_cell_map(self.homography, self.matrix_dim, self.ignore_margin_pt)
+        self.thumbnail_map = self.build_cell_map(self.homography, self.matrix_dim, self.ignore_margin_pt, xo_config_motion_tile)[0]
+
+        # Remap tables of the single fields for the incremental re-classification
+        ty0, ty1, tx0, tx1 = self.cell_bounds
+        self.field_maps = [[(self.cell_map[0][ty0[r][c]:ty1[r][c], tx0[r][c]:tx1[r][c]].copy(),
+                             self.cell_map[1][ty0[r][c]:ty1[r][c], tx0[r][c]:tx1[r][c]].copy()) for c in range(3)] for r in range(3)]
+
+        # Nothing classified yet, the next state reads all nine fields
+        self.cell_signatures = None
+        self.cell_labels = np.zeros((3, 3), dtype = np.int64)
+        self.cell_confidence = np.zeros((3, 3))
+
+
+
+    def track_board(self, img, timestamp = None):
+        '''
+        Follow the board from frame to frame with optical flow on the 16 grid intersections. Once the pose
+        drifted away from the stored one, the corners, the homography and the pixel maps are updated.
+        Frames where the intersections can't be followed (e.g. a hand over the board) are skipped and the
+        next frames are compared to the last good one.
+        - timestamp ... capture time of the frame, time.time() if not given
+        returns ... False once the board hasn't been followed for too long and has to be found again
+        '''
+        timestamp = time.time() if timestamp is None else timestamp
+        gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
+        if self.track_gray is None:
+            self.track_gray = gray
+            self.track_points = self.grid_points.copy()
+            self.track_time = timestamp
+            return True
+
+        # Forward-backward optical flow, a point only counts if it returns to where it started
+        lk_params = dict(winSize = (21, 21), maxLevel = 3, criteria = (cv.TERM_CRITERIA_EPS | cv.TERM_CRITERIA_COUNT, 20, 0.03))
+        previous = self.track_points.reshape(-1, 1, 2)
+        points, status, error = cv.calcOpticalFlowPyrLK(self.track_gray, gray, previous, None, **lk_params)
+        back, back_status, error = cv.calcOpticalFlowPyrLK(gray, self.track_gray, points, None, **lk_params)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (np.abs(back - previous).reshape(-1, 2).max(axis = 1) < 1.0)
+
+        # The whole grid is re-estimated from the points that were followed
+        pose = None
+        if good.sum() >= xo_config_tracking_min_points:
+            pose, inliers = cv.findHomography(self.grid_board[good], points.reshape(-1, 2)[good], cv.RANSAC, 3.0)
+            if pose is None or inliers.sum() < xo_config_tracking_min_points:
+                pose = None
+
+        if pose is None:
+            self.track_failures = self.track_failures + 1
+            self.logger.debug("Board tracking failed on %d frames in a row", self.track_failures)
+            # Measured in time, not frames, so a hand over the board for a moment never counts as a lost board
+            return timestamp - self.track_time < xo_config_tracking_lost_seconds
+
+        self.track_failures = 0
+        self.track_time = timestamp
+        self.track_gray = gray
+        self.track_points = cv.perspectiveTransform(self.grid_board.reshape(-1, 1, 2), pose).reshape(-1, 2)
+
+        drift = np.abs(self.track_points - self.grid_points).max()
+        if drift > xo_config_tracking_drift:
+            self.logger.info("The board moved by %.1f px, its position has been updated", drift)
+            self.grid_points = self.track_points.copy()
+            self.corners = self.grid_points[[0, 3, 15, 12]].copy()
+            self.lines = [[self.line_through(self.grid_points[4 * r], self.grid_points[4 * r + 3]) for r in range(4)],
+                          [self.line_through(self.grid_points[c], self.grid_points[12 + c]) for c in range(4)]]
+            self.homography = cv.getPerspectiveTransform(self.corners, self.matrix_destination)
+            self.update_maps()
+        return True
+
+
+
+    def check_board_position(self, img):
+        '''
+        Quick check of the frozen board position before a new game, one frame of track_board
+        returns ... True if the grid intersections were followed from the last tracked frame to this one
+        '''
+        compared = self.track_gray is not None
+        self.track_board(img)
+        return compared and self.track_failures == 0
+
+
+
+    def line_through(self, point1, point2):
+        '''
+        Line through two points in the Hesse normal form used by HoughLines
+        '''
+        dx, dy = float(point2[0] - point1[0]), float(point2[1] - point1[1])
+
+        # Normal of the line, with the angle in [0, pi) like HoughLines
+        theta = np.arctan2(dx, -dy) % np.pi
+        rho = point1[0] * np.cos(theta) + point1[1] * np.sin(theta)
+        return [[float(rho), float(theta)]]
+
+
+
+    def get_current_state(self, img, with_confidence = False):
         '''
-        Perform analysis of the requested image
+        Perform analysis of the requested image. Only the fields whose mean color moved since they were
+        last classified are analyzed again, the others keep their cached labels.
+        - with_confidence ... return the per-field confidence as well
         returns ... a current state of the board represented byt the standard array
                 ... 0 represents and empy field
                 ... +1 / -1 represents the two possible states
+                ... (state, confidence) with confidence between 0 and 1 per field if with_confidence is set
         '''
-        color_threshold = 20
-        ignore_margin_pt = 10
-
-        # Store image for dashboard
-        cv.imwrite(os.path.join("html/data", "raw_image.jpg"), img)
+        start = time.time()
 
-        # Store image with lines and intersects
-        im_lines = self.image_preprocessing(img)
-        im_lines = cv.cvtColor(im_lines, cv.COLOR_GRAY2RGB)
+        # Store images for dashboard, the writer thread draws and encodes them off the hot path
+        self.dashboard.submit("raw_image.jpg", img)
+        self.dashboard.submit("lines.jpg", img, self.render_lines)
+        self.dashboard.submit("current_state_raw.jpg", img, self.render_cells)
 
-        for line in self.lines[0] + self.lines[1]:
-            im_lines = self.draw_lines(line[0], im_lines)
-        
-        cv.imwrite(os.path.join("html/data", "lines.jpg"), im_lines)
-        
-        # Store image for dashboard
-        cv.imwrite(os.path.join("html/data", "raw_image.jpg"), img)
+        # Mean color of every field from the small mosaic, a moved signature means the field needs another look
+        thumbnail = cv.remap(img, self.thumbnail_map[0], self.thumbnail_map[1], cv.INTER_LINEAR)
+        tile = thumbnail.shape[0] // 3
+        signatures = thumbnail.reshape(3, tile, 3, tile, 3).mean(axis = (1, 3))
 
-        # Re-shape the image to correct for the perspective
-        M = cv.getPerspectiveTransform(self.corners, self.matrix_destination)
-        warp = cv.warpPerspective(img, M, (self.matrix_dim, self.matrix_dim))
-        
-        # Store image for dashboard
-        cv.imwrite(os.path.join("html/data", "current_state_raw.jpg"), warp)
-        
-        # Setup empty arrays for the current state
-        current_state = [[0,0,0],[0,0,0],[0,0,0]]
-        frames = [[None, None, None],[None, None, None],[None, None, None]]
-
-        # Configure offsets for cutting the image
-        field_size = int(self.matrix_dim / 3)
-        ignore_margin_size = ignore_margin_pt * field_size / 100
-        field_size_reduced = field_size - 2 * ignore_margin_size
-        offset_1 = ignore_margin_size
-        offset_2 = ignore_margin_size + field_size_reduced
-        offset_3 = field_size + ignore_margin_size
-        offset_4 = 2 * field_size - ignore_margin_size
-        offset_5 = 2 * field_size + ignore_margin_size
-        offset_6 = 3 * field_size - ignore_margin_size
-
-        # Cut the board and store in a temp variable
-        frames[0][0] = self.cut_image(warp, [offset_1, offset_1, offset_2, offset_2])
-        frames[0][1] = self.cut_image(warp, [offset_3, offset_1, offset_4, offset_2])
-        frames[0][2] = self.cut_image(warp, [offset_5, offset_1, offset_6, offset_2])
-        frames[1][0] = self.cut_image(warp, [offset_1, offset_3, offset_2, offset_4])
-        frames[1][1] = self.cut_image(warp, [offset_3, offset_3, offset_4, offset_4])
-        frames[1][2] = self.cut_image(warp, [offset_5, offset_3, offset_6, offset_4])
-        frames[2][0] = self.cut_image(warp, [offset_1, offset_5, offset_2, offset_6])
-        frames[2][1] = self.cut_image(warp, [offset_3, offset_5, offset_4, offset_6])
-        frames[2][2] = self.cut_image(warp, [offset_5, offset_5, offset_6, offset_6])
-
-        # Stretch the image to a perfect square
-        self.logger.debug("Image frame cutting completed")
-        
-        r = 0
-        for row in frames:
-            c = 0
-            for cell in row:
-                color = self.analyze_color(cell, color_threshold)
+        if self.cell_signatures is None:
+            changed = np.ones((3, 3), dtype = bool)
+            self.cell_signatures = signatures
+        else:
+            changed = np.abs(signatures - self.cell_signatures).max(axis = 2) > xo_config_signature_threshold
+            self.cell_signatures[changed] = signatures[changed]
 
-                if color == 'red':
-                    current_state[r][c] = +1
-                elif color == 'blue':
-                    current_state[r][c] = -1
+        # Correct the perspective of the changed fields only, with the maps precomputed in fix_board_position
+        for r, c in zip(*np.nonzero(changed)):
+            self.cell_labels[r][c], self.cell_confidence[r][c] = self.classify_field(img, r, c)
+        self.logger.debug("%d image fields classified", int(changed.sum()))
 
-                c = c + 1
-            
-            r = r + 1
-        
-        # Stretch the image to a perfect square
+        current_state = self.cell_labels.tolist()
+        self.record_timing("state", start)
         self.logger.debug("Current camera state: " + str(current_state))
         
         # Return the current state
+        if with_confidence:
+            return current_state, self.cell_confidence.tolist()
         return current_state
 
 
@@ -179,37 +296,137 @@ class NaoVision:
     #    SUPPORTING FUNCTIONS
     ## -------------------------------------------------------------
 
+    def classify_field(self, img, row, col):
+        '''
+        Rectify and classify a single field of the camera image
+        returns ... the field label (+1 red, -1 blue, 0 empty) and the confidence of the label between 0 and 1
+        '''
+        field_map = self.field_maps[row][col]
+        field = cv.remap(img, field_map[0], field_map[1], cv.INTER_LINEAR)
+        bounds = [np.array([0]), np.array([field.shape[0]]), np.array([0]), np.array([field.shape[1]])]
+        state, blue_pt, red_pt = self.classify_cells(field, self.color_threshold, bounds)
+
+        # The further the deciding color ratio is from the threshold, the surer the label
+        ratio = {-1: blue_pt[0], 1: red_pt[0], 0: max(blue_pt[0], red_pt[0])}[state[0]]
+        confidence = min(1.0, abs(ratio - self.color_threshold) / float(self.color_threshold))
+        return state[0], confidence
+
+
+
+    def render_cells(self, img):
+        '''
+        Mosaic of the rectified fields for the dashboard
+        '''
+        return cv.remap(img, self.cell_map[0], self.cell_map[1], cv.INTER_LINEAR)
+
+
+
+    def board_thumbnail(self, img):
+        '''
+        Small grayscale mosaic of the nine fields, cheap enough to compare every frame
+        '''
+        cells = cv.remap(img, self.thumbnail_map[0], self.thumbnail_map[1], cv.INTER_LINEAR)
+        return cv.cvtColor(cells, cv.COLOR_BGR2GRAY)
+
+
+
+    def cell_difference(self, thumbnail, reference):
+        '''
+        Mean absolute difference of every field between two thumbnails
+        returns ... (3, 3) array indexed by [row][col]
+        '''
+        tile = thumbnail.shape[0] // 3
+        diff = cv.absdiff(thumbnail, reference).astype(np.float32)
+        return diff.reshape(3, tile, 3, tile).mean(axis = (1, 3))
+
+
+
+    def cell_regions(self, board_size, ignore_margin_pt):
+        '''
+        Pixel bounds of the nine fields of a rectified board, without the margins around the lines.
+        returns ... y0, y1, x0, x1 arrays of shape (3, 3) indexed by [row][col]
+        '''
+        field_size = int(board_size / 3)
+        ignore_margin_size = ignore_margin_pt * field_size // 100
+        starts = np.arange(3) * field_size + ignore_margin_size
+        ends = np.arange(1, 4) * field_size - ignore_margin_size
+
+        y0, x0 = np.meshgrid(starts, starts, indexing = 'ij')
+        y1, x1 = np.meshgrid(ends, ends, indexing = 'ij')
+        return y0, y1, x0, x1
+
+
+
+    def build_cell_map(self, homography, board_size, ignore_margin_pt, tile_size = None):
+        '''
+        Precompute the remap tables that take the nine fields (without the margins) straight from the
+        camera image into a mosaic of equally sized tiles, so the per-frame warp is a single cv.remap.
+        - homography ... perspective transform from the camera image to the rectified board
+        - board_size ... side of the rectified board in pixels
+        - tile_size ... optional side of a mosaic tile in pixels, fields are sampled down to it
+        returns ... (map1, map2) fixed-point maps for cv.remap and the field bounds within the mosaic
+        '''
+        y0, y1, x0, x1 = self.cell_regions(board_size, ignore_margin_pt)
+        field = int(y1[0][0] - y0[0][0])
+        tile = tile_size or field
+
+        # Rectified board coordinates of every mosaic pixel, tile [r][c] holds field [r][c]
+        offsets = (np.arange(3 * tile) % tile + 0.5) * field / tile - 0.5
+        tiles = np.arange(3 * tile) // tile
+        board_y, board_x = np.meshgrid(y0[tiles, 0] + offsets, x0[0, tiles] + offsets, indexing = 'ij')
+
+        # Map them back through the inverse homography to camera image coordinates
+        inverse = np.linalg.inv(homography)
+        points = np.stack([board_x, board_y, np.ones_like(board_x)]).astype(np.float64)
+        source = np.tensordot(inverse, points, axes = 1)
+        map_x = (source[0] / source[2]).astype(np.float32)
+        map_y = (source[1] / source[2]).astype(np.float32)
+
+        starts = np.arange(3) * tile
+        ty0, tx0 = np.meshgrid(starts, starts, indexing = 'ij')
+        bounds = (ty0, ty0 + tile, tx0, tx0 + tile)
+        return cv.convertMaps(map_x, map_y, cv.CV_16SC2), bounds
+
+
+
+    def classify_cells(self, image, threshold, regions):
+        '''
+        Color analysis of all nine fields at once. Every pixel is labeled by a single lookup in the
+        precomputed color table and the label counts of each field come from one bincount.
+        - image ... rectified image of the board, or the mosaic of fields from get_current_state
+        - threshold ... numeric value, in percentages required for significant color
+        - regions ... y0, y1, x0, x1 pixel bounds of the fields, see cell_regions
+        returns ... the board state (+1 red, -1 blue, 0 empty), blue and red percentages per field
+        '''
+        labels = color_table.classify(image, self.color_table)
+
+        y0, y1, x0, x1 = [np.asarray(bound) for bound in regions]
+        counts = np.array([np.bincount(labels[a:b, c:d].ravel(), minlength = 3) for a, b, c, d in zip(y0.flat, y1.flat, x0.flat, x1.flat)])
+        area = ((y1 - y0) * (x1 - x0)).astype(np.float64)
+        blue_pt = 100 * counts[:, color_table.BLUE].reshape(y0.shape) / area
+        red_pt = 100 * counts[:, color_table.RED].reshape(y0.shape) / area
+
+        # Blue takes precedence, same as analyze_color
+        state = np.where(blue_pt > threshold, -1, np.where(red_pt > threshold, 1, 0))
+        return state.tolist(), blue_pt, red_pt
+
+
+
     def find_all_segments(self, h_lines, v_lines):
-        c = 0
-        segments = []
-        while c < 3:
-            
-            column = []
-            r = 0
-            while r < 3:
-                # Select only related lines
-                h_lines_subset = [ h_lines[r], h_lines[r+1] ]
-                v_lines_subset = [ v_lines[c], v_lines[c+1] ]
-                tl, tr, bl, br = self.find_corners(h_lines_subset, v_lines_subset)
-
-                column.append([tl, tr, bl, br])
-                r = r + 1
-
-            segments.append(column)
-            c = c + 1
-        
-        return segments
+        '''
+        Corners of the nine fields, indexed by [col][row] as [tl, tr, bl, br].
+        '''
+        points = board_geometry.rounded(board_geometry.intersections(h_lines, v_lines)).tolist()
+        return [[[tuple(points[r][c]), tuple(points[r][c+1]), tuple(points[r+1][c]), tuple(points[r+1][c+1])] for r in range(3)] for c in range(3)]
 
 
     def find_corners(self, h_lines, v_lines):
         '''
         Convert outer edges to four corner points.
         '''
-        tl = self.get_line_intersect( h_lines[0], v_lines[0] )
-        tr = self.get_line_intersect( h_lines[0], v_lines[-1] )
-        br = self.get_line_intersect( h_lines[-1], v_lines[-1] )
-        bl = self.get_line_intersect( h_lines[-1], v_lines[0] )
-        return tl, tr, bl, br
+        points = board_geometry.rounded(board_geometry.intersections([h_lines[0], h_lines[-1]], [v_lines[0], v_lines[-1]])).tolist()
+        tl, tr, br, bl = board_geometry.corners(np.array(points))
+        return tuple(tl.tolist()), tuple(tr.tolist()), tuple(bl.tolist()), tuple(br.tolist())
 
 
     
@@ -217,29 +434,7 @@ class NaoVision:
         '''
         Takes in lines and return them order from closest to the most distant from the origin. 
         '''
-        simple_array = []
-        for line in lines:
-            rho, theta = line[0]
-
-            # Calculate intersect with the respective axis
-            if horizontal:
-                intersect = rho * np.sin(theta)
-            else:
-                intersect = rho * np.cos(theta)
-            
-            # Added into the simple array for ordering
-            simple_array.append((rho, theta, intersect))
-
-        # Add labels and order lines
-        structured_array = np.array(simple_array, dtype=[('rho', float), ('theta', float), ('intersect', float)])
-        ordered_array = np.sort(structured_array, order='intersect')
-
-        # Re-format the outcome into OpenCV line structure
-        final_array = []
-        for line in ordered_array:
-            final_array.append([[line[0], line[1]]])
-
-        return final_array
+        return [[line] for line in board_geometry.order_lines(lines, horizontal).tolist()]
 
 
     
@@ -269,16 +464,7 @@ class NaoVision:
         Finds the intersection of two lines given in Hesse normal form.
         Returns closest integer pixel locations.
         '''
-        rho1, theta1 = line1[0]
-        rho2, theta2 = line2[0]
-        A = np.array([
-            [np.cos(theta1), np.sin(theta1)],
-            [np.cos(theta2), np.sin(theta2)]
-        ])
-        b = np.array([[rho1], [rho2]])
-        x0, y0 = np.linalg.solve(A, b)
-        x0, y0 = int(np.round(x0)), int(np.round(y0))
-        return (x0, y0)
+        return tuple(board_geometry.rounded(board_geometry.intersections(line1, line2))[0, 0].tolist())
 
 
 
@@ -299,26 +485,20 @@ class NaoVision:
             if len(h_lines) == 4 and len(v_lines) == 4:
 
                 # Make sure each horizontal line intersects precisely 4 vertical lines
-                for h_line in h_lines:
-                    intersect_num = 0
-                    
-                    for v_line in v_lines:
-                        intersect = self.get_line_intersect(h_line, v_line)
-                        
-                        # Intersect is only valid, if the intersection falls within the image dimensions
-                        if img.shape[1] >= intersect[0] >= 0 and img.shape[0] >= intersect[1] >= 0:
-                            intersect_num = intersect_num + 1
-
-                    if intersect_num != 4:
-                        self.logger.debug('Matrix detection failed. One of the horizontal lines has failed to identify four intersects')
-                        valid_matrix = False
+                # ... intersect is only valid, if the intersection falls within the image dimensions
+                points = np.round(board_geometry.intersections(h_lines, v_lines))
+                intersect_num = board_geometry.inside(points, img.shape).sum(axis = 1)
+
+                if (intersect_num != 4).any():
+                    self.logger.debug('Matrix detection failed. One of the horizontal lines has failed to identify four intersects')
+                    valid_matrix = False
             
             else:
                 self.logger.debug('Matrix detection failed. Detected ' + str(len(h_lines)) + ' horizontal and ' + str(len(v_lines)) + ' vertical lines')
                 valid_matrix = False
         
         else:
-            self.logger.debug('Matrix detection failed. Number of lines detected is: ' + lines.shape[0] )
+            self.logger.debug('Matrix detection failed. Number of lines detected is: ' + str(lines.shape[0]) )
             valid_matrix = False
 
         return valid_matrix
@@ -374,20 +554,46 @@ class NaoVision:
 
     def merge_lines(self, lines, img):
         '''
-        Perform k-means to group similar lines
+        Group similar lines deterministically. Lines are split into horizontal and vertical first, each group is
+        swept in the order of the distance from the origin and neighbouring lines within the distance and angle
+        tolerances are merged into their average. The four best supported lines of each direction are kept.
+        returns ... array of merged lines in the HoughLines format, horizontal lines first
         '''
-        sd = np.std(lines, axis = 0)
-        lines = lines / sd
+        if lines is None or len(lines) == 0:
+            return np.zeros((0, 1, 2), dtype = np.float32)
 
-        criteria = (cv.TERM_CRITERIA_EPS, 10, 1.0)
-        ret,label,center = cv.kmeans(lines,8,None,criteria,10,cv.KMEANS_PP_CENTERS)
+        rho = lines[:, 0, 0].astype(np.float64)
+        theta = lines[:, 0, 1].astype(np.float64)
 
-        # Reformat the output from k-means
-        merged_lines = []
-        for line in center:
-            merged_lines.append([line])
+        # Vertical lines wrap around theta = pi, move them next to theta = 0 with the opposite rho
+        wrapped = theta > np.pi / 2
+        vertical = np.abs(np.sin(theta)) < 0.8
+        flip = vertical & wrapped
+        rho = np.where(flip, -rho, rho)
+        theta = np.where(flip, theta - np.pi, theta)
 
-        return merged_lines * sd
+        max_distance = xo_config_line_merge_distance * max(img.shape[:2])
+        merged = []
+        for group in (~vertical, vertical):
+            group_rho, group_theta = rho[group], theta[group]
+            order = np.argsort(group_rho, kind = 'mergesort')
+            group_rho, group_theta = group_rho[order], group_theta[order]
+
+            # A new cluster starts wherever the next line is too far away or too differently angled
+            breaks = (np.diff(group_rho) > max_distance) | (np.abs(np.diff(group_theta)) > xo_config_line_merge_angle)
+            labels = np.concatenate([[0], np.cumsum(breaks)]).astype(np.int64)
+            if len(labels) == 0:
+                continue
+            counts = np.bincount(labels)
+            centers = np.stack([np.bincount(labels, group_rho) / counts, np.bincount(labels, group_theta) / counts], axis = 1)
+
+            # Keep the four clusters with the most lines, in their original order
+            keep = np.sort(np.argsort(-counts, kind = 'mergesort')[:4])
+            merged.append(centers[keep])
+
+        if not merged:
+            return np.zeros((0, 1, 2), dtype = np.float32)
+        return np.concatenate(merged).reshape(-1, 1, 2).astype(np.float32)
 
 
 
@@ -417,7 +623,10 @@ class NaoVision:
 
         # Find image contours
         ret,thresh = cv.threshold(im_transformed,127,255,0)
-        im_cont, contours, hierarchy = cv.findContours(thresh,cv.RETR_TREE,cv.CHAIN_APPROX_SIMPLE)
+        # Only the outer contours matter, the biggest blob is never a hole in another one
+        contours = cv.findContours(thresh,cv.RETR_EXTERNAL,cv.CHAIN_APPROX_SIMPLE)[-2]
+        if len(contours) == 0:
+            return [], 0
         
         # Loop over contours to find the biggest area
         c = 0
@@ -459,27 +668,31 @@ class NaoVision:
         
     
     
-    def image_preprocessing(self, im_orig):
+    def image_preprocessing(self, im_orig, scale = 1):
         '''
         Apply several transformation to preprocess image for blob identification.
         The following filters are applied: convert to grayscale, gaussian blur, adaptive thresholding, bitwise invert and dilating
+        - scale ... downscaling factor of the image, the filter sizes shrink with it
         '''
+        blur_size = max(3, (11 // scale) | 1)
+        window_size = max(3, (5 // scale) | 1)
+        dilate_size = max(3, (5 // scale) | 1)
 
         # Convert to grayscale
         im_temp = cv.cvtColor(im_orig, cv.COLOR_BGR2GRAY)
 
         # Apply gaussian blur to smooth the lines by removing noise
-        im_temp = cv.GaussianBlur(im_temp, (11,11), 0)
+        im_temp = cv.GaussianBlur(im_temp, (blur_size, blur_size), 0)
 
         # Apply adaptive image thresholding
         # ... it calculates a mean over a 5x5 window and subtracts 2 from the mean. This is the threshold level for every pixel.
-        im_temp = cv.adaptiveThreshold(im_temp, 255, cv.ADAPTIVE_THRESH_MEAN_C, cv.THRESH_BINARY, 5, 2)
+        im_temp = cv.adaptiveThreshold(im_temp, 255, cv.ADAPTIVE_THRESH_MEAN_C, cv.THRESH_BINARY, window_size, 2)
 
         # Invert the image
         im_temp = cv.bitwise_not(im_temp)
 
         # Dilate the image to complete small cracks
-        im_transformed = cv.dilate(im_temp, np.ones((5,5), np.uint8), iterations = 1)
+        im_transformed = cv.dilate(im_temp, np.ones((dilate_size, dilate_size), np.uint8), iterations = 1)
 
         return im_transformed
 
@@ -524,6 +737,19 @@ class NaoVision:
 
 
 
+    def render_lines(self, img):
+        '''
+        Image with lines and intersects for the dashboard
+        '''
+        im_lines = self.image_preprocessing(img)
+        im_lines = cv.cvtColor(im_lines, cv.COLOR_GRAY2RGB)
+
+        for line in self.lines[0] + self.lines[1]:
+            im_lines = self.draw_lines(line[0], im_lines)
+        return im_lines
+
+
+
     def renderImage(self, state):
         field_size = 200
         image_size = 3 * field_size
@@ -556,7 +782,7 @@ class NaoVision:
             
             r = r + 1
 
-        cv.imwrite(os.path.join("html/data", "game_state.jpg"), img)
+        self.dashboard.submit("game_state.jpg", img)
 
 
 
@@ -572,29 +798,16 @@ class NaoVision:
         # Reduce the number of colors
         image_segment = self.color_quantization(image_segment, 8)
         
-        # Convert the image to HSV
-        hsv = cv.cvtColor(image_segment, cv.COLOR_BGR2HSV)
-
-        # Threshold the HSV image to get only blue colors
-        lower_blue = np.array([100,100,50])
-        upper_blue = np.array([135,255,255])
-        blue = cv.inRange(hsv, lower_blue, upper_blue)
-        blue_pt = self.calculate_color_ratio(blue)
+        # Label the pixels with the color table
+        labels = color_table.classify(image_segment, self.color_table)
+        counts = np.bincount(labels.ravel(), minlength = 3)
 
-        # Declare the blue state if number of pixel is higher than 50%        
+        # Declare the blue state if number of pixel is higher than the threshold
+        blue_pt = 100.0 * counts[color_table.BLUE] / labels.size
         if blue_pt > threshold:
             return "blue"
-        
-        # Threshold the HSV image to get only blue colors
-        lower_red1 = np.array([-20, 100, 100])
-        upper_red1 = np.array([20, 255, 255])
-        red1 = cv.inRange(hsv, lower_red1, upper_red1)
-        lower_red2 = np.array([155, 100, 100])
-        upper_red2 = np.array([180, 255, 255])
-        red2 = cv.inRange(hsv, lower_red2, upper_red2)
-        red_combined = red1 + red2
-        red_pt = self.calculate_color_ratio(red_combined)
 
+        red_pt = 100.0 * counts[color_table.RED] / labels.size
         if red_pt > threshold:
             return "red"
 
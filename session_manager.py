@@ -0,0 +1,156 @@
+'''
+Consecutive games with one robot connection.
+
+A session keeps the NaoControl and its GameControl between games: the robot connection,
+the proxies, the camera subscription, the posture and the perfect-play table and search cache
+stay warm. Before every game only the game state is reset and the frozen board position is
+checked by following the grid intersections from the last tracked frame, the full board
+search only runs when the board can't be followed. The next game begins once the tokens
+of the previous one are off the board. Every game is recorded, the session statistics
+report the results and the throughput in games per hour.
+'''
+
+import threading
+import time
+
+from config import xo_config_session_pose_frames, xo_config_session_autostart
+from nao_control import GameStopped
+
+RESULTS = {1: 'robot', -1: 'human', 0: 'tie'}
+
+
+class SessionManager:
+
+    def __init__(self, control, logging, pose_frames = xo_config_session_pose_frames, autostart = xo_config_session_autostart):
+        self.control = control
+        self.logger = logging
+        self.pose_frames = pose_frames
+        self.autostart = autostart
+        self.lock = threading.Lock()
+        self.new_session()
+
+
+    def new_session(self):
+        '''
+        Start counting from scratch, e.g. at the beginning of an event
+        '''
+        with self.lock:
+            self.started = time.time()
+            self.games = []
+            self.current = None
+
+
+    def run(self):
+        '''
+        Play games one after another until one is stopped, or just one game without autostart
+        '''
+        while True:
+            record = self.play_game()
+            if record['stopped'] or record['result'] is None or not self.autostart:
+                return
+
+
+    def play_game(self):
+        '''
+        Prepare the robot for the next game and play it, blocks until the game is over or stopped
+        returns ... record of the game
+        '''
+        record = {'number': len(self.games) + 1, 'requested': time.time(), 'pose': None, 'result': None,
+                  'stopped': False, 'moves': 0}
+        with self.lock:
+            self.current = record
+
+        try:
+            record['pose'] = self.prepare_game()
+            record['started'] = time.time()
+            self.control.begin_game()
+        except GameStopped:
+            self.logger.info("The game was stopped before it began.")
+        finally:
+            record['finished'] = time.time()
+            record['stopped'] = self.control.stop_requested.is_set()
+            if not record['stopped']:
+                record['result'] = RESULTS.get(self.control.state.result)
+            record['moves'] = sum(1 for row in self.control.state.board for cell in row if cell != 0)
+            with self.lock:
+                self.games.append(record)
+                self.current = None
+            self.logger.info("Game %d over: %s, session throughput %.1f games/hour", record['number'],
+                             'stopped' if record['stopped'] else str(record['result']), self.games_per_hour())
+        return record
+
+
+    def prepare_game(self):
+        '''
+        Reset the game state, make sure the frozen board position still holds and wait for an empty board
+        returns ... "kept" if the board was followed to its position, "searched" if it had to be found again
+        '''
+        self.control.reset_game()
+        self.control.game.new_game()
+
+        pose = 'searched'
+        for attempt in range(self.pose_frames):
+            self.control.check_stop()
+            if self.control.vision.check_board_position(self.control.take_a_look(self.control.last_frame_time)):
+                self.logger.debug("Board position confirmed after %d frames", attempt + 1)
+                pose = 'kept'
+                break
+        if pose == 'searched':
+            self.control.relocate_board()
+
+        self.wait_for_empty_board()
+        return pose
+
+
+    def wait_for_empty_board(self):
+        '''
+        The tokens of the previous game would count as moves, ask for them to be taken away first
+        '''
+        asked = False
+        while True:
+            self.control.check_stop()
+            board = self.control.vision.get_current_state(self.control.take_a_look(self.control.last_frame_time))
+            if not any(cell != 0 for row in board for cell in row):
+                return
+            if not asked:
+                self.control.tts_say(["Please take the tokens off the board.", "Let us clear the board first.", "Please remove all the tokens for a new game."])
+                asked = True
+            time.sleep(0.5)
+
+
+    def games_per_hour(self, games = None):
+        '''
+        Finished games per hour of the session so far
+        '''
+        games = self.games if games is None else games
+        hours = (time.time() - self.started) / 3600.0
+        finished = sum(1 for game in games if game['result'] is not None)
+        return finished / hours if hours > 0 else 0.0
+
+
+    def stats(self):
+        '''
+        Session statistics for the API
+        '''
+        with self.lock:
+            games = list(self.games)
+            current = self.current
+
+        finished = [game for game in games if game['result'] is not None]
+        results = dict((name, sum(1 for game in finished if game['result'] == name)) for name in RESULTS.values())
+
+        # Dead time between games: from the request of a game until its first move could be made
+        setup = [game['started'] - game['requested'] for game in games if 'started' in game]
+        durations = [game['finished'] - game['started'] for game in finished if 'started' in game]
+        return {
+            'started': self.started,
+            'elapsed': time.time() - self.started,
+            'games': len(finished),
+            'unfinished': len(games) - len(finished),
+            'results': results,
+            'playing': current is not None,
+            'average_game': sum(durations) / len(durations) if durations else None,
+            'average_setup': sum(setup) / len(setup) if setup else None,
+            'board_searches': sum(1 for game in games if game['pose'] == 'searched'),
+            'games_per_hour': self.games_per_hour(games)
+        }
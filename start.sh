@@ -7,6 +7,4 @@ echo "*                                                 *"
 echo "* ----------------------------------------------- *"
 
 
-export FLASK_APP=main.py
-export FLASK_ENV=development
-flask run
+python main.py
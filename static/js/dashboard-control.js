@@ -1,5 +1,14 @@
 var dt = null;
-var parsed = 0;
+var redraw = null;
+
+// Live MJPEG streams of the dashboard images, the files written by the robot as a fallback
+// and a placeholder until the robot has written any
+var streams = {
+    '#status_img_1' : { stream : "api/get_img_camera", file : "data/raw_image.jpg", placeholder : "img/placeholder/raw_image.jpg" },
+    '#status_img_2' : { stream : "api/get_img_blob", file : "data/lines.jpg", placeholder : "img/placeholder/lines.jpg" },
+    '#status_img_3' : { stream : "api/get_img_rectified", file : "data/current_state_raw.jpg", placeholder : "img/placeholder/current_state_raw.jpg" },
+    '#status_img_4' : { stream : "api/get_img_boardstate", file : "data/game_state.jpg", placeholder : "img/placeholder/game_state.jpg" }
+};
 
 function parseLog( i, raw ) {
     var log = { id : i, type : "", text : "", logged : "" };
@@ -14,40 +23,52 @@ function parseLog( i, raw ) {
     return log;
 }
 
-function update_dashboard() {
-    console.log("i\'m here")
-    // Simplify if additional requests are not required
-    $.when(
-        $.ajax({ url: "data/main.log", dataType: "text" })
-    ).then(
-        (main) => {
-            console.log(main)
-            main = main.split('\n');
-            $.each( main, function( index ) {
-                // Ignore empty lines
-                if( main[index] != "" ) {
-                    // Parse only new logs
-                    if(index >= parsed) {
-                        log = parseLog( index, main[index] );
-                        new_row = dt.row.add( [ log.id, log.type.toUpperCase(), log.text, log.logged ] ).draw().node();
-                        $(new_row).addClass('log-'+log.type);
-                        parsed += 1;
-                    }
-                }
-            });
-            $('#status_img_1').attr("src", "data/raw_image.jpg?" + new Date().getTime() );
-            $('#status_img_2').attr("src", "data/lines.jpg?" + new Date().getTime() );
-            $('#status_img_3').attr("src", "data/current_state_raw.jpg?" + new Date().getTime() );
-            $('#status_img_4').attr("src", "data/game_state.jpg?" + new Date().getTime() );
-            
-        }, err => { console.log(err); },
-        // Set timeout for the next check
-        setTimeout(update_dashboard, 2000)
-    );
-    
+function add_log( id, raw ) {
+    var log = parseLog( id, raw );
+    var new_row = dt.row.add( [ log.id, log.type.toUpperCase(), log.text, log.logged ] ).node();
+    $(new_row).addClass('log-'+log.type);
+
+    // Bursts of records are drawn together
+    if( redraw == null ) {
+        redraw = setTimeout(function() { redraw = null; dt.draw(false); }, 200);
+    }
+}
+
+function show_state( state ) {
+    // next_placement is [row, col, result], the result stays null until the game is over
+    var results = { "-1" : "You won the game", "0" : "It is a tie", "1" : "Marvin won the game" };
+    var placement = state.next_placement;
+    var text = "Your turn";
+    if( placement != -1 && placement[2] != null ) {
+        text = results[placement[2]];
+    } else if( placement != -1 && placement[0] != null ) {
+        text = "Marvin plays row " + (placement[0] + 1) + ", column " + (placement[1] + 1);
+    }
+    $('#game_status').text(text);
+}
+
+function listen_events() {
+    // The server pushes the log records and the game state, the browser reconnects by itself
+    // and the server resumes after the last event received
+    var source = new EventSource("api/events");
+    source.addEventListener('log', function( e ) { add_log( e.lastEventId, JSON.parse(e.data) ); });
+    source.addEventListener('state', function( e ) { show_state( JSON.parse(e.data) ); });
+    source.onerror = function( err ) { console.log(err); };
+}
+
+function open_stream( id ) {
+    // The browser keeps the stream open and swaps the image on every frame, a broken stream shows the last
+    // written file and is opened again a bit later
+    $(id).off('error').one('error', function() {
+        $(id).one('error', function() { $(id).attr("src", streams[id].placeholder); });
+        $(id).attr("src", streams[id].file + "?" + new Date().getTime() );
+        setTimeout(function() { open_stream(id); }, 5000);
+    });
+    $(id).attr("src", streams[id].stream + "?" + new Date().getTime() );
 }
 
 $(document).ready(function() {
+    $.each( streams, open_stream );
     dt = $('#dataTable').DataTable({
         "columns": [
             { "width" : "20px" },
@@ -55,5 +76,5 @@ $(document).ready(function() {
             null,
             { "width": "180px" }
         ] });
-    setTimeout(update_dashboard, 500);
+    listen_events();
 });
\ No newline at end of file
@@ -1,6 +1,7 @@
 import numpy as np
 from naoqi import ALProxy
 from nao_vision import NaoVision
+from camera_capture import decode_frame, COLOR_SPACE_BGR
 import cv2 as cv
 from PIL import Image
 import logging
@@ -18,7 +19,7 @@ nao_camera_id = 1
 cam_proxy = ALProxy("ALVideoDevice", nao_ip, nao_port)
 cam_proxy.setActiveCamera(1)
 
-video_client = cam_proxy.subscribeCamera("python_client", 1, 2, 11, 5)
+video_client = cam_proxy.subscribeCamera("python_client", 1, 2, COLOR_SPACE_BGR, 5)
 nao_image = cam_proxy.getImageRemote(video_client)
 
 try:
@@ -35,9 +36,7 @@ try:
         print ('getImageRemote: ' + str( end - start ) )
         
         start = time.time()
-        frame = np.asarray(bytearray(nao_image[6]), dtype=np.uint8)
-        frame = frame.reshape((nao_image[1],nao_image[0],3))
-        frame = frame[...,::-1]
+        frame = decode_frame(nao_image, COLOR_SPACE_BGR)
         end = time.time()
         print ('frame shaping: ' + str( end - start ) )
 
@@ -0,0 +1,36 @@
+from game_control import GameControl
+from game_engine import reachable_positions, decode
+from game_table import position_index
+
+import logging
+import time
+import numpy as np
+logging.basicConfig(format = '%(asctime)s;%(levelname)s;%(filename)s;%(message)s', level = logging.WARNING)
+
+game = GameControl(logging)
+count = 1000000
+
+# Sample positions from every reachable position, both as boards and as packed indices
+positions = sorted(reachable_positions())
+boards = np.array([decode(robot_bits, human_bits) for robot_bits, human_bits in positions], dtype = np.int8)
+indices = np.array([position_index(robot_bits, human_bits) for robot_bits, human_bits in positions], dtype = np.int64)
+sample = np.random.RandomState(0).randint(0, len(positions), count)
+
+for title, batch in [('(N,3,3) int8 boards', boards[sample]), ('packed indices', indices[sample])]:
+    start = time.time()
+    moves, outcomes = game.evaluate_batch(batch)
+    elapsed = time.time() - start
+    print('{:<20} positions: {}   time: {:.3f} s   positions/sec: {:.0f}'.format(title, count, elapsed, count / elapsed))
+
+# Cross-check every reachable position against play()
+moves, outcomes = game.evaluate_batch(boards)
+mismatches = 0
+for i, (robot_bits, human_bits) in enumerate(positions):
+    move = game.play(decode(robot_bits, human_bits))
+    if move[0] is None:
+        expected_move, expected_outcome = -1, move[2]
+    else:
+        expected_move, expected_outcome = move[0] * 3 + move[1], outcomes[i]
+    if moves[i] != expected_move or outcomes[i] != expected_outcome:
+        mismatches += 1
+print('Positions checked against play(): ' + str(len(positions)) + ', mismatches: ' + str(mismatches))
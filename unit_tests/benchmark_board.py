@@ -0,0 +1,102 @@
+import numpy as np
+import cv2 as cv
+from nao_vision import NaoVision
+from dashboard_writer import DashboardWriter
+import logging
+import glob
+import time
+
+logging.basicConfig(format = '%(asctime)s;%(levelname)s;%(filename)s;%(message)s', level = logging.WARNING)
+dashboard = DashboardWriter(logging, enabled = False)
+repeats = 3
+
+
+def legacy_find_lines(vision, im_cleaned, threshold):
+    '''
+    The original line detection: Hough transform of the whole frame
+    '''
+    lines = vision.merge_lines(cv.HoughLines(im_cleaned, 1, np.pi/180, threshold), im_cleaned)
+    im_lines = cv.cvtColor(im_cleaned, cv.COLOR_GRAY2RGB)
+    for line in lines:
+        im_lines = vision.draw_lines(line[0], im_lines)
+    return lines, im_lines
+
+
+def legacy_find_board(vision, img):
+    '''
+    The original detection: full resolution pre-processing and the whole contour hierarchy
+    '''
+    im_transformed = vision.image_preprocessing(img)
+    ret, thresh = cv.threshold(im_transformed, 127, 255, 0)
+    contours = cv.findContours(thresh, cv.RETR_TREE, cv.CHAIN_APPROX_SIMPLE)[-2]
+    areas = [cv.contourArea(contour) for contour in contours] or [0]
+    biggest_blob, biggest_blob_size = contours[int(np.argmax(areas)):][:1], max(areas)
+    if biggest_blob_size >= 140000:
+        im_cleaned = vision.clean_image(im_transformed, biggest_blob)
+        lines, im_lines = legacy_find_lines(vision, im_cleaned, 200)
+        if vision.check_matrix(lines, im_lines):
+            return True, im_cleaned, biggest_blob_size
+        return False, im_lines, biggest_blob_size
+    return False, img, biggest_blob_size
+
+
+def board_lines(find_lines, vision, im_cleaned):
+    '''
+    Merged lines of a cleaned board and the corners fix_board_position freezes from them
+    '''
+    lines = find_lines(vision, im_cleaned, 200)[0]
+    fixed = NaoVision((im_cleaned.shape[1], im_cleaned.shape[0]), logging, dashboard)
+    fixed.find_lines = lambda img, threshold: find_lines(fixed, img, threshold)
+    fixed.fix_board_position(im_cleaned)
+    return lines, fixed.corners
+
+
+def run(find, vision, img):
+    times = []
+    for i in range(repeats):
+        cv.setRNGSeed(0)
+        start = time.time()
+        result = find(img)
+        times.append(time.time() - start)
+    return result, np.mean(times)
+
+
+snapshots = sorted(glob.glob('unit_tests/snapshot*.jpg'))
+
+# The board too far away to be played on: a snapshot shrunk into the middle of an empty frame
+far = cv.imread('unit_tests/snapshot_15.jpg')
+height, width = far.shape[:2]
+small = cv.resize(far, (width // 3, height // 3), interpolation = cv.INTER_AREA)
+far[:] = cv.mean(small)[:3]
+far[height // 3:height // 3 + small.shape[0], width // 3:width // 3 + small.shape[1]] = small
+
+identical = 0
+legacy_times = []
+coarse_times = []
+stages = {}
+print('{:<22} {:>6} {:>10} {:>12} {:>12}'.format('snapshot', 'found', 'blob', 'legacy ms', 'coarse ms'))
+for path, im in [(path, cv.imread(path)) for path in snapshots] + [('board far away', far)]:
+    vision = NaoVision((im.shape[1], im.shape[0]), logging, dashboard)
+    legacy, legacy_time = run(lambda img: legacy_find_board(vision, img), vision, im)
+    coarse, coarse_time = run(vision.find_board, vision, im)
+    same = legacy[0] == coarse[0] and (not legacy[0] or (legacy[2] == coarse[2] and np.array_equal(legacy[1], coarse[1])))
+    if same and legacy[0]:
+        # The board position frozen from the detection has to match as well, not just the cleaned image
+        legacy_lines, legacy_corners = board_lines(legacy_find_lines, vision, legacy[1])
+        coarse_lines, coarse_corners = board_lines(NaoVision.find_lines, vision, coarse[1])
+        same = np.array_equal(legacy_lines, coarse_lines) and np.array_equal(legacy_corners, coarse_corners)
+
+    identical += same
+    legacy_times.append(legacy_time)
+    coarse_times.append(coarse_time)
+    for stage in vision.timings:
+        stages.setdefault(stage, []).append(vision.timings[stage])
+    print('{:<22} {:>6} {:>10.0f} {:>12.2f} {:>12.2f}{}'.format(path.split('/')[-1], str(coarse[0]), coarse[2], 1000 * legacy_time, 1000 * coarse_time, '' if same else '   DIFFERENT'))
+
+print('')
+print('Identical detections: {} of {}'.format(identical, len(legacy_times)))
+print('legacy:          {:8.2f} ms per frame'.format(1000 * np.mean(legacy_times)))
+print('coarse-to-fine:  {:8.2f} ms per frame'.format(1000 * np.mean(coarse_times)))
+for stage in ['coarse', 'preprocessing', 'blob', 'clean', 'lines', 'matrix']:
+    if stage in stages:
+        print('  {:<14} {:8.2f} ms'.format(stage, np.mean(stages[stage])))
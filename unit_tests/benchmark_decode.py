@@ -0,0 +1,64 @@
+import numpy as np
+import cv2 as cv
+from camera_capture import decode_frame, RESOLUTIONS, COLOR_SPACE_RGB, COLOR_SPACE_BGR
+import time
+
+repeats = 50
+
+
+def legacy_decode(nao_image):
+    '''
+    The original take_a_look decoding of an RGB frame
+    '''
+    frame = np.asarray(bytearray(nao_image[6]), dtype=np.uint8)
+    frame = frame.reshape((nao_image[1],nao_image[0],3))
+    frame = frame[...,::-1]
+    return frame
+
+
+def for_opencv(frame):
+    # OpenCV copies non-contiguous input before it can work on it
+    return np.ascontiguousarray(frame)
+
+
+def copied_bytes(payload, frame, ready):
+    '''
+    Bytes copied to get from the camera payload to a C-contiguous frame
+    '''
+    source = np.frombuffer(payload, dtype = np.uint8)
+    copies = 0
+    if not np.may_share_memory(frame, source):
+        copies += 1
+    if ready is not frame and not np.may_share_memory(ready, frame):
+        copies += 1
+    return copies * len(payload)
+
+
+def measure(decode, nao_image):
+    start = time.time()
+    for i in range(repeats):
+        ready = for_opencv(decode(nao_image))
+    elapsed = (time.time() - start) / repeats
+    frame = decode(nao_image)
+    return elapsed, copied_bytes(nao_image[6], frame, for_opencv(frame)), for_opencv(frame)
+
+
+print('{:<12} {:<16} {:>12} {:>14}'.format('resolution', 'decoding', 'ms / frame', 'bytes copied'))
+for resolution in sorted(RESOLUTIONS):
+    width, height = RESOLUTIONS[resolution]
+    rgb = np.random.RandomState(resolution).randint(0, 256, (height, width, 3)).astype(np.uint8)
+    bgr = np.ascontiguousarray(rgb[..., ::-1])
+
+    # getImageRemote returns [width, height, layers, color space, seconds, microseconds, payload, ...]
+    rgb_image = [width, height, 3, COLOR_SPACE_RGB, 0, 0, rgb.tobytes()]
+    bgr_image = [width, height, 3, COLOR_SPACE_BGR, 0, 0, bgr.tobytes()]
+    buffer = np.empty((height, width, 3), dtype = np.uint8)
+
+    results = [
+        ('legacy RGB', measure(legacy_decode, rgb_image)),
+        ('frombuffer RGB', measure(lambda image: decode_frame(image, COLOR_SPACE_RGB, buffer), rgb_image)),
+        ('frombuffer BGR', measure(lambda image: decode_frame(image, COLOR_SPACE_BGR), bgr_image)),
+    ]
+    for name, (elapsed, copied, frame) in results:
+        assert frame.flags['C_CONTIGUOUS'] and np.array_equal(frame, bgr)
+        print('{:<12} {:<16} {:>12.3f} {:>14}'.format(str(width) + 'x' + str(height), name, 1000 * elapsed, copied))
@@ -0,0 +1,111 @@
+from game_control import GameControl
+from game_engine import reachable_positions, decode, count_bits, WINNING
+
+import logging
+import time
+logging.basicConfig(format = '%(asctime)s;%(levelname)s;%(filename)s;%(message)s', level = logging.INFO)
+
+
+class LegacyMinimax:
+    '''
+    The original list-of-lists search, kept here as the baseline for the benchmark.
+    '''
+
+    def __init__(self):
+        self.nodes = 0
+
+    def is_win(self, board):
+        win_state = [
+            [board[0][0], board[0][1], board[0][2]],
+            [board[1][0], board[1][1], board[1][2]],
+            [board[2][0], board[2][1], board[2][2]],
+            [board[0][0], board[1][0], board[2][0]],
+            [board[0][1], board[1][1], board[2][1]],
+            [board[0][2], board[1][2], board[2][2]],
+            [board[0][0], board[1][1], board[2][2]],
+            [board[2][0], board[1][1], board[0][2]],
+        ]
+
+        if [1, 1, 1] in win_state:
+            return 10
+        elif [-1, -1, -1] in win_state:
+            return -10
+        else:
+            return False
+
+    def empty_cells(self, board):
+        cells = []
+        for x, row in enumerate(board):
+            for y, cell in enumerate(row):
+                if cell == 0:
+                    cells.append([x, y])
+        return cells
+
+    def minimax(self, state, depth, player):
+        self.nodes += 1
+        if player == 1:
+            best = [-1, -1, -1000]
+        else:
+            best = [-1, -1, +1000]
+
+        evaluate_state = self.is_win(state)
+        if depth == 0 or evaluate_state:
+            return [-1, -1, evaluate_state]
+
+        for cell in self.empty_cells(state):
+            x, y = cell[0], cell[1]
+            state[x][y] = player
+            score = self.minimax(state, depth-1, -player)
+            state[x][y] = 0
+            score[0], score[1] = x, y
+
+            if player == 1:
+                if score[2] > best[2]:
+                    best = score
+            else:
+                if score[2] < best[2]:
+                    best = score
+
+        return best
+
+
+def run_legacy(positions):
+    legacy = LegacyMinimax()
+    results = []
+    start = time.time()
+    for robot_bits, human_bits in positions:
+        board = decode(robot_bits, human_bits)
+        depth = 9 - count_bits(robot_bits | human_bits)
+        results.append(legacy.minimax(board, depth, 1)[:2])
+    return results, legacy.nodes, time.time() - start
+
+
+def run_bitboard(positions, cache_size = 0):
+    game = GameControl(logging, table = None, cache_size = cache_size)
+    results = []
+    start = time.time()
+    for robot_bits, human_bits in positions:
+        depth = 9 - count_bits(robot_bits | human_bits)
+        score, cell = game.engine.minimax(robot_bits, human_bits, depth, 1)
+        results.append([cell // 3, cell % 3])
+    return results, game.engine.nodes, time.time() - start, game.cache
+
+
+def report(name, nodes, elapsed):
+    print('{:<10} nodes: {:>10}   time: {:>8.3f} s   nodes/sec: {:>12.0f}'.format(name, nodes, elapsed, nodes / max(elapsed, 1e-9)))
+
+
+open_positions = sorted(p for p in reachable_positions() if not (WINNING[p[0]] or WINNING[p[1]]) and (p[0] | p[1]) != 0x1FF)
+
+for title, positions in [('Empty board', [(0, 0)]), ('Every reachable position (' + str(len(open_positions)) + ')', open_positions)]:
+    print(title)
+    legacy_moves, legacy_nodes, legacy_time = run_legacy(positions)
+    report('legacy', legacy_nodes, legacy_time)
+    bitboard_moves, bitboard_nodes, bitboard_time, _ = run_bitboard(positions)
+    report('bitboard', bitboard_nodes, bitboard_time)
+    print('speedup: {:.1f}x, identical moves: {}'.format(legacy_time / max(bitboard_time, 1e-9), legacy_moves == bitboard_moves))
+    cached_moves, cached_nodes, cached_time, cache = run_bitboard(positions, 50000)
+    report('cached', cached_nodes, cached_time)
+    print('node reduction: {:.1f}x, speedup: {:.1f}x, identical moves: {}'.format(float(legacy_nodes) / cached_nodes, legacy_time / max(cached_time, 1e-9), legacy_moves == cached_moves))
+    print('cache: ' + str(cache.stats()))
+    print('')
@@ -0,0 +1,87 @@
+import numpy as np
+import cv2 as cv
+from nao_vision import NaoVision
+from dashboard_writer import DashboardWriter
+import board_geometry
+import logging
+import glob
+import time
+
+logging.basicConfig(format = '%(asctime)s;%(levelname)s;%(filename)s;%(message)s', level = logging.WARNING)
+dashboard = DashboardWriter(logging, enabled = False)
+repeats = 200
+
+
+def legacy_intersect(line1, line2):
+    rho1, theta1 = line1[0]
+    rho2, theta2 = line2[0]
+    A = np.array([[np.cos(theta1), np.sin(theta1)], [np.cos(theta2), np.sin(theta2)]])
+    b = np.array([[rho1], [rho2]])
+    x0, y0 = np.linalg.solve(A, b)
+    return int(np.round(x0[0])), int(np.round(y0[0]))
+
+
+def legacy_order(lines, horizontal):
+    simple_array = []
+    for line in lines:
+        rho, theta = line[0]
+        intersect = rho * np.sin(theta) if horizontal else rho * np.cos(theta)
+        simple_array.append((rho, theta, intersect))
+    structured_array = np.array(simple_array, dtype=[('rho', float), ('theta', float), ('intersect', float)])
+    return [[[line[0], line[1]]] for line in np.sort(structured_array, order='intersect')]
+
+
+def legacy_geometry(h_lines, v_lines, shape):
+    '''
+    The original per-pair solving: matrix check, ordering, corners and the 36 field corners
+    '''
+    valid = True
+    for h_line in h_lines:
+        count = 0
+        for v_line in v_lines:
+            x, y = legacy_intersect(h_line, v_line)
+            if shape[1] >= x >= 0 and shape[0] >= y >= 0:
+                count += 1
+        valid = valid and count == 4
+    h_lines, v_lines = legacy_order(h_lines, True), legacy_order(v_lines, False)
+    corners = [legacy_intersect(h_lines[r], v_lines[c]) for r, c in [(0, 0), (0, 3), (3, 3), (3, 0)]]
+    segments = [[[legacy_intersect(h_lines[r + i], v_lines[c + j]) for i, j in [(0, 0), (0, 1), (1, 0), (1, 1)]] for r in range(3)] for c in range(3)]
+    return valid, corners, segments
+
+
+def vectorized_geometry(h_lines, v_lines, shape):
+    valid = (board_geometry.inside(np.round(board_geometry.intersections(h_lines, v_lines)), shape).sum(axis = 1) == 4).all()
+    points = board_geometry.rounded(board_geometry.grid(h_lines, v_lines)).tolist()
+    corners = [tuple(points[r][c]) for r, c in [(0, 0), (0, 3), (3, 3), (3, 0)]]
+    segments = [[[tuple(points[r + i][c + j]) for i, j in [(0, 0), (0, 1), (1, 0), (1, 1)]] for r in range(3)] for c in range(3)]
+    return valid, corners, segments
+
+
+def timed(function, *args):
+    start = time.time()
+    for i in range(repeats):
+        result = function(*args)
+    return result, (time.time() - start) / repeats
+
+
+legacy_times = []
+vector_times = []
+identical = 0
+for path in sorted(glob.glob('unit_tests/snapshot*.jpg')):
+    im = cv.imread(path)
+    vision = NaoVision((im.shape[1], im.shape[0]), logging, dashboard)
+    board_found, result, blob_size = vision.find_board(im)
+    if not board_found:
+        continue
+    lines, im_lines = vision.find_lines(result, 200)
+    h_lines, v_lines = vision.split_lines(lines)
+
+    legacy, legacy_time = timed(legacy_geometry, h_lines, v_lines, im.shape)
+    vector, vector_time = timed(vectorized_geometry, h_lines, v_lines, im.shape)
+    legacy_times.append(legacy_time)
+    vector_times.append(vector_time)
+    identical += legacy == vector
+
+print('Boards: {}, identical geometry: {}'.format(len(legacy_times), identical))
+print('per pair solving: {:8.3f} ms per board'.format(1000 * np.mean(legacy_times)))
+print('vectorized:       {:8.3f} ms per board'.format(1000 * np.mean(vector_times)))
@@ -0,0 +1,77 @@
+import numpy as np
+import cv2 as cv
+from nao_vision import NaoVision
+from dashboard_writer import DashboardWriter
+import logging
+import glob
+import time
+
+logging.basicConfig(format = '%(asctime)s;%(levelname)s;%(filename)s;%(message)s', level = logging.WARNING)
+dashboard = DashboardWriter(logging, enabled = False)
+runs = 20
+
+
+def legacy_merge_lines(lines, img):
+    '''
+    The original k-means grouping into eight lines
+    '''
+    sd = np.std(lines, axis = 0)
+    lines = lines / sd
+    criteria = (cv.TERM_CRITERIA_EPS, 10, 1.0)
+    ret, label, center = cv.kmeans(lines, 8, None, criteria, 10, cv.KMEANS_PP_CENTERS)
+    return np.array([[line] for line in center]) * sd
+
+
+def hough_lines(vision, im):
+    '''
+    Hough lines of the cleaned board blob, the input of the merging stage
+    '''
+    captured = []
+    merge_lines = vision.merge_lines
+    vision.merge_lines = lambda lines, img: captured.append((lines, img)) or merge_lines(lines, img)
+    vision.find_board(im)
+    del vision.merge_lines
+    return captured[0] if captured else (None, None)
+
+
+def repeated(merge, lines, img):
+    outputs = set()
+    start = time.time()
+    for run in range(runs):
+        merged = merge(lines, img)
+        outputs.add(np.round(np.asarray(merged, dtype = np.float64), 3).tobytes())
+    return (time.time() - start) / runs, len(outputs)
+
+
+def detections(vision, im, merge):
+    found = 0
+    vision.merge_lines = merge
+    for run in range(runs):
+        found += vision.find_board(im)[0]
+    del vision.merge_lines
+    return found
+
+
+legacy_times = []
+merge_times = []
+print('{:<20} {:>6} {:>22} {:>22} {:>18}'.format('snapshot', 'lines', 'k-means ms / outputs', 'sweep ms / outputs', 'found k-means/sweep'))
+for path in sorted(glob.glob('unit_tests/snapshot*.jpg')):
+    im = cv.imread(path)
+    vision = NaoVision((im.shape[1], im.shape[0]), logging, dashboard)
+    lines, img = hough_lines(vision, im)
+    if lines is None:
+        print('{:<20} no blob'.format(path.split('/')[-1]))
+        continue
+
+    legacy_time, legacy_outputs = repeated(legacy_merge_lines, lines, img)
+    merge_time, merge_outputs = repeated(vision.merge_lines, lines, img)
+    legacy_found = detections(vision, im, legacy_merge_lines)
+    merge_found = detections(vision, im, vision.merge_lines)
+
+    legacy_times.append(legacy_time)
+    merge_times.append(merge_time)
+    print('{:<20} {:>6} {:>14.2f} / {:>5} {:>14.2f} / {:>5} {:>10} / {:>5}'.format(path.split('/')[-1], len(lines), 1000 * legacy_time, legacy_outputs, 1000 * merge_time, merge_outputs, legacy_found, merge_found))
+
+print('')
+print('k-means:  {:8.3f} ms per frame'.format(1000 * np.mean(legacy_times)))
+print('sweep:    {:8.3f} ms per frame'.format(1000 * np.mean(merge_times)))
@@ -0,0 +1,43 @@
+from game_control import GameControl
+from game_kinarow import LineBoard
+
+import logging
+import multiprocessing
+import time
+logging.basicConfig(format = '%(asctime)s;%(levelname)s;%(filename)s;%(message)s', level = logging.INFO)
+
+# Mid-game 15x15 gomoku-style position, searched to a fixed depth without a time budget
+size = 15
+k = 5
+depth = 6
+moves = [(7, 7, -1), (7, 8, 1), (8, 8, -1), (6, 6, 1), (6, 8, -1), (8, 6, 1)]
+
+
+def run(workers):
+    game = GameControl(logging, table = None, size = size, k = k, time_budget_ms = None, workers = workers)
+    board = [[0] * size for row in range(size)]
+    for row, col, player in moves:
+        board[row][col] = player
+
+    # Warm up the pool so process start-up is not part of the measurement
+    if workers > 1:
+        game.kinarow.best_move(LineBoard.from_rows(board, k), game.robot, 1)
+
+    game.kinarow.nodes = 0
+    start = time.time()
+    score, cell = game.kinarow.best_move(LineBoard.from_rows(board, k), game.robot, depth)
+    elapsed = time.time() - start
+    nodes = game.kinarow.nodes
+    game.close()
+    return cell, score, nodes, elapsed
+
+
+if __name__ == '__main__':
+    print('CPU count: ' + str(multiprocessing.cpu_count()) + ', depth ' + str(depth))
+    baseline = None
+    for workers in [1, 2, 4, 8]:
+        cell, score, nodes, elapsed = run(workers)
+        if baseline is None:
+            baseline = (cell, score, elapsed)
+        print('workers: {}   move: [{}, {}]   score: {:>12}   nodes: {:>8}   time: {:>7.3f} s   speedup: {:.2f}x   same move: {}'.format(
+            workers, cell // size, cell % size, score, nodes, elapsed, baseline[2] / elapsed, (cell, score) == baseline[:2]))
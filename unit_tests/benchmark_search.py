@@ -0,0 +1,49 @@
+from game_control import GameControl
+from game_engine import reachable_positions, count_bits, WINNING, FULL_MASK
+
+import logging
+import time
+logging.basicConfig(format = '%(asctime)s;%(levelname)s;%(filename)s;%(message)s', level = logging.INFO)
+
+# Compare the plain minimax with the alpha-beta search, with and without the transposition cache
+configurations = [
+    ('minimax', 0),
+    ('minimax', 50000),
+    ('alphabeta', 0),
+    ('alphabeta', 50000),
+]
+
+open_positions = sorted(p for p in reachable_positions() if not (WINNING[p[0]] or WINNING[p[1]]) and (p[0] | p[1]) != FULL_MASK)
+
+
+def run(search, cache_size, positions):
+    game = GameControl(logging, table = None, cache_size = cache_size, search = search)
+    scores = []
+    start = time.time()
+    for robot_bits, human_bits in positions:
+        depth = 9 - count_bits(robot_bits | human_bits)
+        scores.append(game.engine.minimax(robot_bits, human_bits, depth, game.robot)[0])
+    return scores, game.engine.nodes, time.time() - start
+
+
+def sign(score):
+    return (score > 0) - (score < 0)
+
+
+for title, positions in [('Empty board', [(0, 0)]), ('Every reachable position (' + str(len(open_positions)) + ')', open_positions)]:
+    print(title)
+    reference = None
+    for search, cache_size in configurations:
+        scores, nodes, elapsed = run(search, cache_size, positions)
+        outcomes = [sign(score) for score in scores]
+        if reference is None:
+            reference = outcomes
+        print('{:<10} cache: {:>6}   nodes: {:>10}   time: {:>8.3f} s   same outcomes: {}'.format(search, cache_size, nodes, elapsed, outcomes == reference))
+    print('')
+
+# Depth-aware scoring: the robot can win immediately at [2,0], minimax settles for the slower win at [1,1]
+board = [ [1, -1, -1], [1, 0, 0], [0, -1, 0] ]
+print('Board with an immediate win at [2, 0]')
+for search in ['minimax', 'alphabeta']:
+    game = GameControl(logging, table = None, search = search)
+    print('{:<10} move: {}'.format(search, game.minimax([row[:] for row in board], 4, game.robot)))
@@ -0,0 +1,79 @@
+import numpy as np
+import cv2 as cv
+from nao_vision import NaoVision
+from dashboard_writer import DashboardWriter
+import logging
+import time
+
+logging.basicConfig(format = '%(asctime)s;%(levelname)s;%(filename)s;%(message)s', level = logging.WARNING)
+dashboard = DashboardWriter(logging, enabled = False)
+
+snapshots = ["unit_tests/snapshot_sm_1.jpg", "unit_tests/snapshot_3.jpg", "unit_tests/snapshot_15.jpg", "unit_tests/snapshot_16.jpg"]
+bump_frames = 5
+camera_fps = 5
+
+
+def with_tokens(vision, im):
+    '''
+    Paint a blue and a red token into the camera image
+    '''
+    warp = cv.warpPerspective(im, vision.homography, (vision.matrix_dim, vision.matrix_dim))
+    field_size = vision.matrix_dim // 3
+    cv.circle(warp, (field_size // 2, field_size // 2), int(field_size * 0.35), (200, 60, 30), -1)
+    cv.circle(warp, (2 * field_size + field_size // 2, field_size + field_size // 2), int(field_size * 0.35), (40, 40, 200), -1)
+
+    size = (im.shape[1], im.shape[0])
+    flags = cv.INTER_LINEAR | cv.WARP_INVERSE_MAP
+    board = cv.warpPerspective(warp, vision.homography, size, flags = flags)
+    inside = cv.warpPerspective(np.full(warp.shape[:2], 255, np.uint8), vision.homography, size, flags = flags)
+    out = im.copy()
+    out[inside == 255] = board[inside == 255]
+    return out
+
+
+for path in snapshots:
+    cv.setRNGSeed(0)
+    im = cv.imread(path)
+    vision = NaoVision((im.shape[1], im.shape[0]), logging, dashboard)
+    board_found, result, blob_size = vision.find_board(im)
+    if not board_found:
+        print(path + ': board not found, skipped')
+        continue
+    vision.fix_board_position(result)
+
+    camera = with_tokens(vision, im)
+    state = vision.get_current_state(camera)
+    vision.track_board(camera)
+    corners = vision.corners.copy()
+
+    # Steady board
+    start = time.time()
+    for i in range(10):
+        vision.track_board(camera)
+    steady_time = (time.time() - start) / 10
+
+    # The board gets bumped: shifted and rotated a little more on every frame
+    size = (im.shape[1], im.shape[0])
+    start = time.time()
+    for step in range(1, bump_frames + 1):
+        M = cv.getRotationMatrix2D((size[0] / 2.0, size[1] / 2.0), 0.6 * step, 1.0)
+        M[:, 2] += (4 * step, -3 * step)
+        moved = cv.warpAffine(camera, M, size, borderMode = cv.BORDER_REPLICATE)
+        tracked = vision.track_board(moved)
+    bump_time = (time.time() - start) / bump_frames
+    expected = cv.transform(corners.reshape(-1, 1, 2), M).reshape(-1, 2)
+    error = np.abs(vision.corners - expected).max()
+
+    # A hand over most of the board, the tracking gives up after a while and recovers once the board is visible,
+    # the frames arrive at the frame rate of the camera
+    hand = moved.copy()
+    cv.rectangle(hand, (0, 0), (size[0] * 2 // 3, size[1]), (120, 150, 200), -1)
+    covered = time.time()
+    occluded = [vision.track_board(hand, covered + float(i) / camera_fps) for i in range(1, 6 * camera_fps)]
+    lost_after = float(occluded.index(False) + 1) / camera_fps if False in occluded else None
+    recovered = vision.track_board(moved)
+
+    print(path.split('/')[-1])
+    print('  steady:   {:6.2f} ms per frame'.format(1000 * steady_time))
+    print('  bumped:   {:6.2f} ms per frame, tracked: {}, corner error: {:.2f} px, same state: {}'.format(1000 * bump_time, tracked, error, vision.get_current_state(moved) == state))
+    print('  occluded: lost after {} s, recovered: {}'.format(lost_after, recovered))
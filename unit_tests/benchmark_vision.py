@@ -0,0 +1,271 @@
+import numpy as np
+import cv2 as cv
+from nao_vision import NaoVision
+from dashboard_writer import DashboardWriter
+import color_table
+import logging
+import random
+import glob
+import time
+
+logging.basicConfig(format = '%(asctime)s;%(levelname)s;%(filename)s;%(message)s', level = logging.WARNING)
+dashboard = DashboardWriter(logging, enabled = False)
+
+snapshots = ["unit_tests/snapshot_sm_1.jpg", "unit_tests/snapshot_3.jpg", "unit_tests/snapshot_15.jpg", "unit_tests/snapshot_16.jpg"]
+color_threshold = 20
+ignore_margin_pt = 10
+repeats = 3
+
+
+# HSV thresholds of the original analyze_color, kept here since nao_vision classifies with the color table now
+LEGACY_HSV_BLUE = (np.array([100, 100, 50]), np.array([135, 255, 255]))
+LEGACY_HSV_RED_LOW = (np.array([-20, 100, 100]), np.array([20, 255, 255]))
+LEGACY_HSV_RED_HIGH = (np.array([155, 100, 100]), np.array([180, 255, 255]))
+
+
+def legacy_analyze_color(vision, image_segment, threshold):
+    '''
+    Frozen copy of the original analyze_color: k-means color quantization and HSV thresholding
+    '''
+    image_segment = vision.color_quantization(image_segment, 8)
+    hsv = cv.cvtColor(image_segment, cv.COLOR_BGR2HSV)
+
+    blue = cv.inRange(hsv, LEGACY_HSV_BLUE[0], LEGACY_HSV_BLUE[1])
+    if vision.calculate_color_ratio(blue) > threshold:
+        return "blue"
+
+    red1 = cv.inRange(hsv, LEGACY_HSV_RED_LOW[0], LEGACY_HSV_RED_LOW[1])
+    red2 = cv.inRange(hsv, LEGACY_HSV_RED_HIGH[0], LEGACY_HSV_RED_HIGH[1])
+    if vision.calculate_color_ratio(red1 + red2) > threshold:
+        return "red"
+
+    return False
+
+
+def legacy_state(vision, warp):
+    '''
+    The original per-field path: cut nine segments, k-means color quantization and HSV thresholding for each
+    '''
+    y0, y1, x0, x1 = vision.cell_regions(warp.shape[0], ignore_margin_pt)
+    state = [[0, 0, 0], [0, 0, 0], [0, 0, 0]]
+    for r in range(3):
+        for c in range(3):
+            cell = vision.cut_image(warp, [x0[r][c], y0[r][c], x1[r][c], y1[r][c]])
+            color = legacy_analyze_color(vision, cell, color_threshold)
+            if color == 'red':
+                state[r][c] = +1
+            elif color == 'blue':
+                state[r][c] = -1
+    return state
+
+
+def add_tokens(warp, seed):
+    '''
+    Paint red and blue tokens into random fields of the rectified board
+    '''
+    rnd = random.Random(seed)
+    img = warp.copy()
+    field_size = warp.shape[0] // 3
+    expected = [[0, 0, 0], [0, 0, 0], [0, 0, 0]]
+    for r in range(3):
+        for c in range(3):
+            token = rnd.choice([0, 1, -1])
+            if token != 0:
+                center = (c * field_size + field_size // 2, r * field_size + field_size // 2)
+                color = (40, 40, 200) if token == 1 else (200, 60, 30)
+                cv.circle(img, center, int(field_size * 0.35), color, -1)
+            expected[r][c] = token
+    return img, expected
+
+
+legacy_times = []
+vector_times = []
+frames = 0
+agree = 0
+correct = 0
+
+for path in snapshots:
+    cv.setRNGSeed(0)
+    im = cv.imread(path)
+    vision = NaoVision((im.shape[1], im.shape[0]), logging, dashboard)
+    board_found, result, blob_size = vision.find_board(im)
+    if not board_found:
+        print(path + ': board not found, skipped')
+        continue
+    vision.fix_board_position(result)
+
+    warp = cv.warpPerspective(im, vision.homography, (vision.matrix_dim, vision.matrix_dim))
+
+    for seed in range(repeats):
+        frame, expected = add_tokens(warp, seed)
+
+        start = time.time()
+        legacy = legacy_state(vision, frame)
+        legacy_times.append(time.time() - start)
+
+        start = time.time()
+        vector = vision.classify_cells(frame, color_threshold, vision.cell_regions(frame.shape[0], ignore_margin_pt))[0]
+        vector_times.append(time.time() - start)
+
+        frames += 1
+        agree += legacy == vector
+        correct += vector == expected
+
+print('Frames: {}, identical to the k-means path: {}, matching the painted tokens: {}'.format(frames, agree, correct))
+print('k-means per field:   {:8.2f} ms per frame'.format(1000 * np.mean(legacy_times)))
+print('single pass:         {:8.2f} ms per frame'.format(1000 * np.mean(vector_times)))
+print('')
+
+
+def camera_frame(vision, im, frame):
+    '''
+    Project a rectified board with painted tokens back into the camera image
+    '''
+    size = (im.shape[1], im.shape[0])
+    flags = cv.INTER_LINEAR | cv.WARP_INVERSE_MAP
+    board = cv.warpPerspective(frame, vision.homography, size, flags = flags)
+    inside = cv.warpPerspective(np.full(frame.shape[:2], 255, np.uint8), vision.homography, size, flags = flags)
+    out = im.copy()
+    out[inside == 255] = board[inside == 255]
+    return out
+
+
+# Per-frame perspective correction: full warp of the board vs the precomputed remap of the fields
+warp_times = []
+remap_times = []
+frames = 0
+agree = 0
+correct = 0
+
+for path in snapshots:
+    cv.setRNGSeed(0)
+    im = cv.imread(path)
+    vision = NaoVision((im.shape[1], im.shape[0]), logging, dashboard)
+    board_found, result, blob_size = vision.find_board(im)
+    if not board_found:
+        continue
+    vision.fix_board_position(result)
+    warp = cv.warpPerspective(im, vision.homography, (vision.matrix_dim, vision.matrix_dim))
+
+    for seed in range(repeats):
+        frame, expected = add_tokens(warp, seed)
+        camera = camera_frame(vision, im, frame)
+
+        start = time.time()
+        M = cv.getPerspectiveTransform(vision.corners, vision.matrix_destination)
+        board = cv.warpPerspective(camera, M, (vision.matrix_dim, vision.matrix_dim))
+        warped = vision.classify_cells(board, color_threshold, vision.cell_regions(board.shape[0], ignore_margin_pt))[0]
+        warp_times.append(time.time() - start)
+
+        start = time.time()
+        cells = cv.remap(camera, vision.cell_map[0], vision.cell_map[1], cv.INTER_LINEAR)
+        remapped = vision.classify_cells(cells, color_threshold, vision.cell_bounds)[0]
+        remap_times.append(time.time() - start)
+
+        frames += 1
+        agree += warped == remapped
+        correct += remapped == expected
+
+print('Frames: {}, identical to the full warp: {}, matching the painted tokens: {}'.format(frames, agree, correct))
+print('full warp:           {:8.2f} ms per frame'.format(1000 * np.mean(warp_times)))
+print('cached remap:        {:8.2f} ms per frame'.format(1000 * np.mean(remap_times)))
+print('')
+
+
+# Incremental re-classification: tokens are added one per frame, only the changed field is read again
+incremental_times = []
+full_times = []
+frames = 0
+agree = 0
+
+for path in snapshots:
+    cv.setRNGSeed(0)
+    im = cv.imread(path)
+    vision = NaoVision((im.shape[1], im.shape[0]), logging, dashboard)
+    board_found, result, blob_size = vision.find_board(im)
+    if not board_found:
+        continue
+    vision.fix_board_position(result)
+    frame = cv.warpPerspective(im, vision.homography, (vision.matrix_dim, vision.matrix_dim))
+    field_size = vision.matrix_dim // 3
+    vision.get_current_state(im)
+
+    order = list(range(9))
+    random.Random(path).shuffle(order)
+    for turn, cell in enumerate(order):
+        r, c = cell // 3, cell % 3
+        color = (40, 40, 200) if turn % 2 else (200, 60, 30)
+        cv.circle(frame, (c * field_size + field_size // 2, r * field_size + field_size // 2), int(field_size * 0.35), color, -1)
+        camera = camera_frame(vision, im, frame)
+
+        start = time.time()
+        incremental = vision.get_current_state(camera)
+        incremental_times.append(time.time() - start)
+
+        start = time.time()
+        full = vision.classify_cells(vision.render_cells(camera), color_threshold, vision.cell_bounds)[0]
+        full_times.append(time.time() - start)
+
+        frames += 1
+        agree += incremental == full
+
+print('Frames: {}, identical to all nine fields read: {}'.format(frames, agree))
+print('all nine fields:     {:8.2f} ms per frame'.format(1000 * np.mean(full_times)))
+print('changed fields only: {:8.2f} ms per frame'.format(1000 * np.mean(incremental_times)))
+
+print('')
+
+
+def hsv_state(image, regions):
+    '''
+    The HSV path: conversion and cv.inRange thresholds on every pixel, per-field counts from an integral image
+    '''
+    hsv = cv.cvtColor(image, cv.COLOR_BGR2HSV)
+    (blue_range, ), (red_low, red_high) = color_table.xo_config_hsv_blue, color_table.xo_config_hsv_red
+    blue = cv.inRange(hsv, np.array(blue_range[0]), np.array(blue_range[1]))
+    red = cv.bitwise_or(cv.inRange(hsv, np.array(red_low[0]), np.array(red_low[1])), cv.inRange(hsv, np.array(red_high[0]), np.array(red_high[1])))
+
+    y0, y1, x0, x1 = regions
+    area = ((y1 - y0) * (x1 - x0)).astype(np.float64)
+    ratios = []
+    for mask in (blue, red):
+        integral = cv.integral(mask // 255)
+        ratios.append(100 * (integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]) / area)
+    return np.where(ratios[0] > color_threshold, -1, np.where(ratios[1] > color_threshold, 1, 0)).tolist()
+
+
+# Pixel labeling: HSV conversion and thresholds vs the quantized color lookup table, on the real boards
+hsv_times = []
+table_times = []
+frames = 0
+agree = 0
+pixels = 0
+same_pixels = 0
+
+for path in sorted(glob.glob('unit_tests/snapshot*.jpg')):
+    cv.setRNGSeed(0)
+    im = cv.imread(path)
+    vision = NaoVision((im.shape[1], im.shape[0]), logging, dashboard)
+    board_found, result, blob_size = vision.find_board(im)
+    if not board_found:
+        continue
+    vision.fix_board_position(result)
+    cells = vision.render_cells(im)
+
+    start = time.time()
+    hsv = hsv_state(cells, vision.cell_bounds)
+    hsv_times.append(time.time() - start)
+
+    start = time.time()
+    table = vision.classify_cells(cells, color_threshold, vision.cell_bounds)[0]
+    table_times.append(time.time() - start)
+
+    frames += 1
+    agree += hsv == table
+    labels = color_table.hsv_labels(cells)
+    pixels += labels.size
+    same_pixels += (labels == color_table.classify(cells, vision.color_table)).sum()
+
+print('Boards: {}, identical to the HSV thresholds: {}, identical pixel labels: {:.2f} %'.format(frames, agree, 100.0 * same_pixels / pixels))
+print('HSV thresholds:      {:8.2f} ms per frame'.format(1000 * np.mean(hsv_times)))
+print('lookup table:        {:8.2f} ms per frame'.format(1000 * np.mean(table_times)))